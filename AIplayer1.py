@@ -1,193 +1,552 @@
 import math
 import random
-from copy import deepcopy
-from func_timeout import func_timeout, FunctionTimedOut
+from collections import OrderedDict
+from board import (SQUARE_NAMES, SQUARE_TIER, ZOBRIST_KEYS, ZOBRIST_SIDE, ZOBRIST_TABLES, Board,
+                   get_flips, get_moves, iter_bits, zobrist)
+from budget import SearchBudget
+from endgame import DEFAULT_EMPTIES, EndgameSolver, empties, endgame_budget
+from opening_book import DEFAULT_BOOK, load_book
+from parallel_mcts import RootParallelSearch
 
+# 行棋方 <--> 数组中的编号
+COLORS = ('X', 'O')
+COLOR_INDEX = {'X': 0, 'O': 1}
+# 边数组中“无子可下，跳过”的走法编号
+PASS_MOVE = 64
+MOVE_NAMES = SQUARE_NAMES + ['none']
 
-class Node:
-    
-    
-    
+# NumPy 模块，第一次建树时由 _import_numpy 导入，只创建玩家而不搜索时不导入
+np = None
+
+
+def _import_numpy():
+    """
+    导入 NumPy 并保存到模块变量 np，返回该模块
+    """
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+def legal_moves(black, white, color):
+    """
+    计算行棋方的合法落子与局面是否结束
+    :param color: 行棋方编号（0-黑棋, 1-白棋）
+    :return: (合法落子位棋盘, 是否终局)
+    """
+    own, opp = (black, white) if color == 0 else (white, black)
+    legal = get_moves(own, opp)
+    return legal, not legal and not get_moves(opp, own)
+
+
+class SearchTree(object):
+    '''
+    结构数组（struct of arrays）形式的搜索树。
+    节点的访问次数、双方累计奖励、父节点、局面等分别保存在按需倍增扩容的 NumPy 数组中，节点用下标表示；
+    节点 i 的子节点是边数组中 [child_start[i], child_start[i] + child_count[i]) 这一段，
+    每条边记录走法与子节点下标，child_count 为 -1 表示尚未扩展。
+    扩展时只登记走法，子节点下标为 -1（待生成），第一次被选中时才生成子节点。
+    置换表共享的节点会出现在多个父节点的子节点区间中，parent 只记录第一个父节点。
+    局面只保存黑白双方的位棋盘与行棋方的合法落子，模拟时才构造 Board。
+    NumPy 在第一次建树时才导入，只创建玩家而不搜索（例如对局开始前）不会导入。
+    '''
     # UCT 探索系数
     EXPLORATION_COEFFICIENT = 2
+    # 节点数组：(名称, 类型, 每个节点的元素个数)
+    NODE_FIELDS = (('parent', 'int32', 1), ('color', 'int8', 1), ('is_over', 'bool', 1),
+                   ('visits', 'int64', 1), ('reward', 'int64', 2), ('bits', 'uint64', 2),
+                   ('legal', 'uint64', 1), ('key', 'uint64', 1), ('child_start', 'int32', 1), ('child_count', 'int16', 1))
+    # 边数组：(名称, 类型)
+    EDGE_FIELDS = (('edge_child', 'int32'), ('edge_move', 'int8'))
+
+    def __init__(self, capacity=1024):
+        _import_numpy()
+        self.size = 0
+        self.edge_size = 0
+        for name, dtype, width in self.NODE_FIELDS:
+            setattr(self, name, np.zeros((capacity, width) if width > 1 else capacity, dtype))
+        for name, dtype in self.EDGE_FIELDS:
+            setattr(self, name, np.zeros(capacity * 8, dtype))
+
+    def _resize(self, names, capacity):
+        # 将若干数组扩容到 capacity，保留已有内容
+        for name in names:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
 
-    def __init__(self, board, color, root_color, parent=None, pre_action=None):
+    def _reserve(self, nodes, edges=0):
+        # 保证还能再容纳 nodes 个节点与 edges 条边，不足时容量翻倍
+        if self.size + nodes > len(self.visits):
+            self._resize([field[0] for field in self.NODE_FIELDS], max(2 * len(self.visits), self.size + nodes))
+        if self.edge_size + edges > len(self.edge_child):
+            self._resize([field[0] for field in self.EDGE_FIELDS],
+                         max(2 * len(self.edge_child), self.edge_size + edges))
+
+    def add_node(self, black, white, color, key, parent=-1):
         """
-        初始化节点，保存棋盘状态、当前行棋方、合法动作等信息。
+        新增一个未扩展的节点
+        :param black: 黑棋位棋盘
+        :param white: 白棋位棋盘
+        :param color: 行棋方编号（0-黑棋, 1-白棋）
+        :param key: 局面的 Zobrist 键（含行棋方）
+        :return: 节点下标
         """
-        self.board = board
-        self.color = color.upper()
-        self.root_color = root_color.upper()
-        self.parent = parent
-        self.children = []           # 存储子节点列表
-        self.pre_action = pre_action
-        
-        # 获取当前合法走法列表
-        self.actions = list(self.board.get_legal_actions(color=self.color))
-        # 判断当前局面是否结束
-        self.is_over = self._check_game_over()
+        self._reserve(1)
+        i = self.size
+        self.size += 1
+        legal, is_over = legal_moves(black, white, color)
+        self.parent[i] = parent
+        self.color[i] = color
+        self.is_over[i] = is_over
+        self.visits[i] = 0
+        self.reward[i] = 0
+        self.bits[i] = black, white
+        self.legal[i] = legal
+        self.key[i] = key
+        self.child_start[i] = 0
+        self.child_count[i] = -1
+        return i
 
-        # 初始化节点统计数据
-        self.visit_count = 0
-        self.reward = {'X': 0, 'O': 0}
-        # 初始设为负无穷，未访问节点不参与最佳子节点比较
-        self.value = {'X': float('-inf'), 'O': float('-inf')}
-        self.is_leaf = True
+    def set_children(self, node, moves):
+        """
+        扩展节点：在边数组末尾登记其全部走法，子节点待生成
+        :param moves: 各子节点的走法编号（位序号，PASS_MOVE 表示跳过）
+        """
+        n = len(moves)
+        self._reserve(0, n)
+        start = self.edge_size
+        self.edge_move[start:start + n] = moves
+        self.edge_child[start:start + n] = -1
+        self.edge_size += n
+        self.child_start[node] = start
+        self.child_count[node] = n
 
-         #初始化最佳子节点记录（根据 UCT 和奖励）
-        self.best_child = None
-        self.best_reward_child = None
+    def children(self, node):
+        """
+        子节点下标数组（视图）
+        """
+        start = self.child_start[node]
+        return self.edge_child[start:start + max(self.child_count[node], 0)]
 
-    def _check_game_over(self):
+    def moves(self, node):
         """
-        判断游戏结束条件：当双方均无合法走法时，游戏结束。
+        到达各子节点的走法编号数组（视图）
         """
-        return (len(list(self.board.get_legal_actions('X'))) == 0 and
-                len(list(self.board.get_legal_actions('O'))) == 0)
+        start = self.child_start[node]
+        return self.edge_move[start:start + max(self.child_count[node], 0)]
 
-    def update_value(self):
+    def board_bits(self, node):
         """
-        根据 UCT 公式更新当前节点的估值，计算平衡利用和探索的目标函数值。
+        节点局面的 (黑棋位棋盘, 白棋位棋盘)
         """
-        if self.visit_count == 0 or self.parent is None:
-            return
-        for col in ['X', 'O']:
-            exploitation = self.reward[col] / self.visit_count
-            exploration = Node.EXPLORATION_COEFFICIENT * math.sqrt(
-                2 * math.log(self.parent.visit_count) / self.visit_count
-            )
-            self.value[col] = exploitation + exploration
+        black, white = self.bits[node].tolist()
+        return black, white
 
-    def add_child(self, child):
+    def best_child(self, node, children):
         """
-        添加新的子节点，并更新标记和最佳子节点记录。
+        按节点行棋方的 UCT 值选择子节点，所有子节点一次向量化计算，未访问或待生成的子节点不参与比较
+        :return: 最佳子节点在 children 中的位置
         """
-        self.children.append(child)
-        self.is_leaf = False
-        self.best_child = self._select_best_child()
-        self.best_reward_child = self._select_best_reward_child()
+        n = self.visits[children]
+        n[children < 0] = 0
+        reward = self.reward[children, self.color[node]]
+        # r / n + c * sqrt(2 ln N / n) = (r + c * sqrt(2 n ln N)) / n
+        uct = np.full(len(n), -np.inf)
+        np.divide(reward + self.EXPLORATION_COEFFICIENT * np.sqrt(2 * math.log(self.visits[node]) * n), n,
+                  out=uct, where=n > 0)
+        return int(uct.argmax())
 
-    def _select_best_child(self):
+    def best_reward_child(self, node, color):
         """
-        按照当前玩家的 UCT 值选择最佳的子节点。
+        按 color 一方的平均奖励（胜率）选择子节点
+        :return: 最佳子节点在子节点区间中的位置，没有访问过的子节点时返回 None
         """
-        if not self.children:
+        children = self.children(node)
+        n = self.visits[children]
+        n[children < 0] = 0
+        if not n.any():
             return None
-        return max(self.children, key=lambda child: child.value.get(self.color, float('-inf')))
+        rate = np.full(len(n), -np.inf)
+        np.divide(self.reward[children, color], n, out=rate, where=n > 0)
+        return int(rate.argmax())
 
-    def _select_best_reward_child(self):
+    def compact(self, root):
         """
-        根据模拟得到的奖励（胜率）选择最优子节点。
+        只保留 root 可到达的节点，按广度优先顺序重新编号，root 成为 0 号节点
+        :return: 保留的节点数
         """
-        if not self.children:
-            return None
-        def reward_rate(child):
-            if child.visit_count > 0:
-                return child.reward[self.color] / child.visit_count
-            return float('-inf')
-        return max(self.children, key=reward_rate)
+        order = [root]
+        parent = {root: -1}
+        for node in order:
+            for child in self.children(node).tolist():
+                if child >= 0 and child not in parent:
+                    parent[child] = node
+                    order.append(child)
+        index = np.array(order)
+        remap = np.full(self.size, -1, np.int32)
+        remap[index] = np.arange(len(order))
+        # 边数组按新编号顺序拼接：新区间起点为子节点数的前缀和
+        counts = np.maximum(self.child_count[index], 0).astype(np.int64)
+        starts = np.cumsum(counts) - counts
+        edge_index = np.arange(counts.sum()) + np.repeat(self.child_start[index] - starts, counts)
+        for name, _, _ in self.NODE_FIELDS:
+            setattr(self, name, getattr(self, name)[index])
+        old_parent = np.array([parent[node] for node in order])
+        self.parent = np.where(old_parent >= 0, remap[old_parent], -1).astype(np.int32)
+        self.child_start = starts.astype(np.int32)
+        edge_child = self.edge_child[edge_index]
+        self.edge_child = np.where(edge_child >= 0, remap[edge_child], -1).astype(np.int32)
+        self.edge_move = self.edge_move[edge_index]
+        self.size = len(order)
+        self.edge_size = len(edge_index)
+        return self.size
+
+    def nbytes(self):
+        """
+        数组占用的字节数
+        """
+        return sum(getattr(self, field[0]).nbytes for field in self.NODE_FIELDS + self.EDGE_FIELDS)
+
+
 class MonteCarloSearch:
-    def __init__(self, board, color, timeout=3):
-        # 复制棋盘状态构造根节点
-        self.root = Node(board=deepcopy(board), color=color, root_color=color)
+    def __init__(self, board, color, timeout=3, table_size=200000, rollout_batch=1, seed=None, budget=None,
+                 widening=None):
+        """
+        :param widening: 渐进扩宽参数 (c, alpha)：访问 n 次的节点只考虑按 Roxanne 优先级排序的前
+                         max(1, int(c * n ** alpha)) 个走法，为空时考虑全部走法
+        """
         self.color = color.upper()
         self.timeout = timeout
+        # 搜索预算（时间、迭代次数、节点数、内存），为空时只按 timeout 限时
+        self.budget = budget
+
+        # 搜索树，根节点保存传入棋盘的局面
+        self.tree = SearchTree()
+        key = board.hash_key(self.color)
+        self.root = self.tree.add_node(board._bits['X'], board._bits['O'], COLOR_INDEX[self.color], key)
+
+        # 置换表：Zobrist 键 --> 节点下标，不同走子顺序到达的相同局面共享统计数据
+        # 超出容量时按最近最少使用（LRU）淘汰，被淘汰的节点仍保留在树中，只是不再参与合并
+        self.table_size = table_size
+        self.table = OrderedDict()
+        self.table[key] = self.root
 
         # 探索参数：初始 epsilon 及其衰减因子 gamma
         self.epsilon = 0.3
         self.gamma = 0.999
+        self.widening = widening
+
+        # 每个叶节点的模拟次数，大于 1 时使用 NumPy 批量模拟一次完成
+        self.rollout_batch = rollout_batch
+        self.rng = None
+        self.rollout_board = None
+        if rollout_batch > 1:
+            from rollout import rollout_board
+            self.rng = _import_numpy().random.default_rng(seed)
+            self.rollout_board = rollout_board
+
+    @property
+    def node_count(self):
+        return self.tree.size
+
+    def root_actions(self):
+        # 根节点的合法走法
+        return list(self._board(self.root).get_legal_actions(self.color))
 
     def search(self):
         # 当根节点仅有一个合法动作时直接返回
-        if len(self.root.actions) == 1:
-            return self.root.actions[0]
-        try:
-            func_timeout(timeout=self.timeout, func=self._build_tree)
-        except FunctionTimedOut:
-            pass
-        best_node = self.root._select_best_reward_child()
-        return best_node.pre_action if best_node is not None else None
-
-    def _build_tree(self):
-        # 构建蒙特卡洛树，直至超时为止
+        actions = self.root_actions()
+        if len(actions) == 1:
+            return actions[0]
+        self._run()
+        best = self.tree.best_reward_child(self.root, COLOR_INDEX[self.color])
+        if best is None:
+            return None
+        return MOVE_NAMES[self.tree.moves(self.root)[best]]
+
+    def advance(self, board, color):
+        # 复用上一步的搜索树：找到实际局面（己方落子与对方应手之后）对应的节点，提升为新的根节点
+        # 其余部分在压缩时丢弃；找不到时返回 False
+        node = self._lookup(board._bits['X'], board._bits['O'], COLOR_INDEX[color], board.hash_key(color))
+        if node is None:
+            node = self._find_descendant(board, color, depth=2)
+        if node is None:
+            return False
+        self.color = color
+        self._prune(node)
+        return True
+
+    def _find_descendant(self, board, color, depth):
+        # 在根节点以下 depth 层内逐层查找与 board 相同的局面（置换表中的节点可能已被淘汰）
+        tree = self.tree
+        bits = (board._bits['X'], board._bits['O'])
+        level = [self.root]
+        for _ in range(depth):
+            level = [child for node in level for child in tree.children(node).tolist() if child >= 0]
+            for node in level:
+                if tree.color[node] == COLOR_INDEX[color] and tree.board_bits(node) == bits:
+                    return node
+        return None
+
+    def _prune(self, root):
+        # 只保留新根节点可到达的节点，重建置换表
+        tree = self.tree
+        tree.compact(root)
+        self.root = 0
+        self.table = OrderedDict()
+        for node, key in enumerate(tree.key[:tree.size].tolist()):
+            self._store(node, key)
+
+    def _run(self):
+        # 在预算内建树：每次迭代结束时检查预算，用完即在两次迭代之间停止，树始终保持完整
+        # 预算在创建时开始计时；节点数只计本次搜索新建的节点，不含复用的上一步搜索树（与 AIplayer2 一致）
+        budget = self.budget if self.budget is not None else SearchBudget(time_limit=self.timeout)
+        start_size = self.tree.size
         while True:
-            current_node = self._select()
-            # 终局判断
-            if current_node.is_over:
-                winner, diff = current_node.board.get_winner()
-            else:
-                # 对访问过的节点进行扩展
-                if current_node.visit_count > 0:
-                    current_node = self._expand(current_node)
-                winner, diff = self._simulate(current_node)
-            self._back_propagate(current_node, winner, diff)
+            self._iterate()
+            if not budget.step(self.tree.size - start_size):
+                break
+
+    def root_statistics(self):
+        # 根节点各走法的 (访问次数, 当前玩家累计奖励)，用于根并行时合并
+        tree = self.tree
+        children = tree.children(self.root)
+        created = children >= 0
+        children = children[created]
+        rewards = tree.reward[children, COLOR_INDEX[self.color]].tolist()
+        moves = tree.moves(self.root)[created].tolist()
+        return {MOVE_NAMES[move]: (visits, reward)
+                for move, visits, reward in zip(moves, tree.visits[children].tolist(), rewards)}
+
+    def search_until(self, should_stop, check_every=16):
+        # 持续建树直到 should_stop() 为真（用于后台思考），每 check_every 次迭代检查一次
+        while not should_stop():
+            for _ in range(check_every):
+                self._iterate()
+
+    def _iterate(self):
+        # 一次完整的选择、扩展、模拟与反向传播
+        tree = self.tree
+        path = self._select()
+        node = path[-1]
+        # 终局判断
+        if tree.is_over[node]:
+            winner, diff = self._board(node).get_winner()
+            result = self._reward_delta(winner, diff, self.rollout_batch)
+        else:
+            # 对访问过的节点进行扩展
+            if tree.visits[node] > 0:
+                node = self._expand(node)
+                path.append(node)
+            result = self._simulate(node)
+        self._back_propagate(path, *result)
 
     def _select(self):
-        # 从根节点出发依据 epsilon-greedy 策略选择到叶子节点
+        # 从根节点出发依据 epsilon-greedy 策略选择到叶子节点，返回经过的节点下标
+        # 选中尚未生成的子节点时才生成它（生成节点可能使数组扩容，因此每次都经由 tree 访问数组）
+        tree = self.tree
         node = self.root
+        path = [node]
         current_epsilon = self.epsilon
-        while not node.is_leaf:
+        while tree.child_count[node] > 0:
+            start = int(tree.child_start[node])
+            children = tree.edge_child[start:start + self._admitted(node)]
             if random.random() > current_epsilon:
-                child = node._select_best_child()
+                edge = start + tree.best_child(node, children)
             else:
-                child = random.choice(node.children)
+                edge = start + random.randrange(len(children))
+            child = int(tree.edge_child[edge])
+            if child < 0:
+                child = self._materialize(node, edge)
             node = child
+            path.append(node)
             current_epsilon *= self.gamma
-        return node
+        return path
+
+    def _admitted(self, node):
+        # 渐进扩宽：节点当前参与选择的走法数
+        count = int(self.tree.child_count[node])
+        if self.widening is None:
+            return count
+        coefficient, exponent = self.widening
+        return min(count, max(1, int(coefficient * self.tree.visits[node] ** exponent)))
+
+    def _board(self, node):
+        # 由节点的位棋盘构造棋盘
+        return Board.from_bits(*self.tree.board_bits(node))
 
     def _simulate(self, node):
-        # 模拟从当前节点随机走子至游戏结束
-        sim_board = deepcopy(node.board)
-        sim_color = node.color
+        # 模拟从当前节点随机走子至游戏结束，返回 (模拟次数, 黑棋奖励增量, 白棋奖励增量)
+        sim_board = self._board(node)
+        sim_color = COLORS[self.tree.color[node]]
+        if self.rollout_batch > 1:
+            winners, diffs = self.rollout_board(sim_board, sim_color, self.rollout_batch, self.rng)
+            black_win = int(diffs[winners == 0].sum())
+            white_win = int(diffs[winners == 1].sum())
+            return self.rollout_batch, black_win - white_win, -black_win
         while not self._is_game_over(sim_board):
             legal_actions = list(sim_board.get_legal_actions(color=sim_color))
             if legal_actions:
                 sim_board._move(random.choice(legal_actions), sim_color)
             sim_color = 'X' if sim_color == 'O' else 'O'
-        return sim_board.get_winner()
+        winner, diff = sim_board.get_winner()
+        return self._reward_delta(winner, diff)
+
+    def _reward_delta(self, winner, diff, n=1):
+        # 将 n 次相同的对局结果换算为 (模拟次数, 黑棋奖励增量, 白棋奖励增量)
+        if winner == 0:
+            return n, diff * n, -diff * n
+        elif winner == 1:
+            return n, -diff * n, 0
+        return n, 0, -diff * n
 
     def _expand(self, node):
-        # 对当前节点所有合法走法生成子节点
-        if not node.actions:
-            new_board = deepcopy(node.board)
-            next_color = 'X' if node.color == 'O' else 'O'
-            child = Node(board=new_board, color=next_color, root_color=self.color,
-                         parent=node, pre_action="none")
-            node.add_child(child)
-            return child
-
-        for action in node.actions:
-            new_board = deepcopy(node.board)
-            new_board._move(action=action, color=node.color)
-            next_color = 'X' if node.color == 'O' else 'O'
-            child = Node(board=new_board, color=next_color, root_color=self.color,
-                         parent=node, pre_action=action)
-            node.add_child(child)
-        return node._select_best_child()
-
-    def _back_propagate(self, node, winner, diff):
-        # 将模拟结果反向传播更新每个节点的统计数据
-        while node is not None:
-            node.visit_count += 1
-            if winner == 0:
-                node.reward['O'] -= diff
-                node.reward['X'] += diff
-            elif winner == 1:
-                node.reward['X'] -= diff
-            elif winner == 2:
-                node.reward['O'] -= diff
-            node.update_value()
-            node = node.parent
+        # 扩展节点：只按 Roxanne 优先级登记合法走法，不生成子节点；随后生成并返回优先级最高的子节点
+        tree = self.tree
+        legal = int(tree.legal[node])
+        moves = sorted(iter_bits(legal), key=SQUARE_TIER.__getitem__) if legal else [PASS_MOVE]
+        tree.set_children(node, moves)
+        return self._materialize(node, int(tree.child_start[node]))
+
+    def _materialize(self, node, edge):
+        # 生成边 edge 指向的子节点：直接在位棋盘上落子，增量计算子局面的 Zobrist 键；
+        # 置换表中已有相同局面时共享该节点
+        tree = self.tree
+        color = int(tree.color[node])
+        black, white = tree.board_bits(node)
+        key = int(tree.key[node]) ^ ZOBRIST_SIDE
+        sq = int(tree.edge_move[edge])
+        if sq != PASS_MOVE:
+            own, opp = (black, white) if color == 0 else (white, black)
+            move = 1 << sq
+            flips = get_flips(move, own, opp)
+            own, opp = own | flips | move, opp ^ flips
+            black, white = (own, opp) if color == 0 else (opp, own)
+            key ^= ZOBRIST_KEYS[COLORS[color]][sq] ^ zobrist(flips, ZOBRIST_TABLES['flip'])
+        child = self._lookup(black, white, 1 - color, key)
+        if child is None:
+            child = self._store(tree.add_node(black, white, 1 - color, key, node), key)
+        tree.edge_child[edge] = child
+        return child
+
+    def _lookup(self, black, white, color, key):
+        # 在置换表中查找相同局面（同一行棋方）的节点，命中时刷新其 LRU 顺序
+        node = self.table.get(key)
+        if node is None or self.tree.color[node] != color or self.tree.board_bits(node) != (black, white):
+            return None
+        self.table.move_to_end(key)
+        return node
+
+    def _store(self, node, key):
+        # 将新节点登记到置换表，超出容量时淘汰最久未使用的表项
+        self.table[key] = node
+        if len(self.table) > self.table_size:
+            self.table.popitem(last=False)
+        return node
+
+    def _back_propagate(self, path, visits, black_delta, white_delta):
+        # 沿本次选择的路径将模拟结果反向传播，整条路径一次向量化更新
+        # 节点可能被多个父节点共享，因此不能沿 parent 指针回溯；同一路径上不会出现重复节点
+        tree = self.tree
+        tree.visits[path] += visits
+        tree.reward[path, 0] += black_delta
+        tree.reward[path, 1] += white_delta
+        table = self.table
+        for key in reversed(tree.key[path].tolist()):
+            if key in table:
+                table.move_to_end(key)
 
     def _is_game_over(self, board):
-        return (len(list(board.get_legal_actions('X'))) == 0 and
-                len(list(board.get_legal_actions('O'))) == 0)
+        return board.is_game_over()
+
+
+def root_search(board, color, time_limit, seed=None, rollout_batch=1, widening=None):
+    """
+    根并行搜索的工作函数：独立建树并返回根节点统计
+    """
+    mcts = MonteCarloSearch(board, color, timeout=time_limit, rollout_batch=rollout_batch, seed=seed,
+                            widening=widening)
+    actions = mcts.root_actions()
+    if len(actions) == 1:
+        return {actions[0]: (1, 0)}
+    mcts._run()
+    return mcts.root_statistics()
+
+
 class AIPlayer:
-    def __init__(self, color: str):
+    def __init__(self, color: str, rollout_batch=1, workers=1, time_limit=3, reuse_tree=True,
+                 adaptive_time=False, max_nodes=None, max_memory_mb=None, widening=None,
+                 endgame_empties=DEFAULT_EMPTIES, book=DEFAULT_BOOK):
+        """
+        :param workers: 根并行的进程数，为 1 时在当前进程中单树搜索
+        :param reuse_tree: 是否在相邻两步之间复用搜索树（仅单树搜索）
+        :param adaptive_time: 是否按对局阶段分配每步时间，time_limit 为平均每步时间
+        :param max_nodes: 每步新建节点数上限（复用的搜索树不计入）
+        :param max_memory_mb: 进程内存上限（MB）
+        :param widening: 渐进扩宽参数 (c, alpha)，见 MonteCarloSearch
+        :param endgame_empties: 空格数不超过此值时改用残局精确求解，为 0 时不使用
+        :param book: 开局库文件，为空或文件不存在时不使用开局库
+        """
         self.color = color.upper()
+        self.rollout_batch = rollout_batch
+        self.widening = widening
+        self.time_limit = time_limit
+        self.parallel = RootParallelSearch(workers) if workers > 1 else None
+        self.reuse_tree = reuse_tree
+        self.adaptive_time = adaptive_time
+        self.max_nodes = max_nodes
+        self.max_memory_mb = max_memory_mb
+        self.tree = None
+        self.endgame_empties = endgame_empties
+        self.endgame = EndgameSolver() if endgame_empties else None
+        self.book = load_book(book)
         self.thinking_message = "请稍后，{}正在思考".format("黑棋(X)" if self.color == 'X' else "白棋(O)")
 
     def get_move(self, board):
         print(self.thinking_message)
-        mcts = MonteCarloSearch(board, self.color)
-        return mcts.search()
\ No newline at end of file
+        if self.book is not None:
+            move = self.book.lookup(board, self.color)
+            if move is not None:
+                return move
+        budget = SearchBudget.for_move(board, self.time_limit, self.adaptive_time,
+                                       nodes=self.max_nodes, memory_mb=self.max_memory_mb)
+        if self.endgame is not None and empties(board) <= self.endgame_empties:
+            # 残局精确求解，预算用完时退回蒙特卡洛树搜索
+            move = self.endgame.best_move(board, self.color, endgame_budget(budget.time_limit))
+            if move is not None:
+                return move
+        if self.parallel is not None:
+            stats = self.parallel.run(root_search, board, self.color, budget.time_limit,
+                                      rollout_batch=self.rollout_batch, widening=self.widening)
+            # 与单树一致：选择平均奖励最高的走法
+            return max(stats, key=lambda a: stats[a][1] / stats[a][0] if stats[a][0] else float('-inf'),
+                       default=None)
+        mcts = self.tree
+        if mcts is None or not mcts.advance(board, self.color):
+            mcts = MonteCarloSearch(board, self.color, timeout=self.time_limit, rollout_batch=self.rollout_batch,
+                                    widening=self.widening)
+        mcts.budget = budget
+        if self.reuse_tree:
+            self.tree = mcts
+        return mcts.search()
+
+    def ponder(self, board, should_stop):
+        """
+        对方思考期间在后台继续搜索：以对方待走的局面为根扩展同一棵树，直到 should_stop() 为真
+        :param board: 己方落子之后的局面
+        """
+        op_color = 'O' if self.color == 'X' else 'X'
+        if self.parallel is not None or not self.reuse_tree or next(board.get_legal_actions(op_color), None) is None:
+            return
+        if self.endgame is not None and empties(board) <= self.endgame_empties:
+            return
+        mcts = self.tree
+        if mcts is None or not mcts.advance(board, op_color):
+            mcts = MonteCarloSearch(board, op_color, timeout=self.time_limit, rollout_batch=self.rollout_batch,
+                                    widening=self.widening)
+        self.tree = mcts
+        mcts.search_until(should_stop)
\ No newline at end of file
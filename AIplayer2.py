@@ -1,38 +1,61 @@
 import random  
 from math import log, sqrt    
-from time import time       
-from copy import deepcopy
-from game import Game
-from board import Board
-
-class SilentGame(Game):
-    def __init__(self, black_player, white_player, board = Board(), current_player = None):
-        super().__init__(black_player, white_player)
-        self.board = deepcopy(board) 
-        self.current_player = current_player
-        
-    def run(self):
-        winner = None
-        diff = -1
-        while True:
-            self.current_player = self.switch_player(self.black_player, self.white_player)
-            color = "X" if self.current_player == self.black_player else "O"
-            legal_actions = list(self.board.get_legal_actions(color))
-            if len(legal_actions) == 0:
-                if self.game_over():
-                    winner, diff = self.board.get_winner() 
-                    break
-                else:
-                    continue
-            action = self.current_player.get_move(self.board)
-            if action is None:
-                continue
-            else:
-                self.board._move(action, color)
-                if self.game_over():
-                    winner, diff = self.board.get_winner()
-                    break
-        return winner, diff
+from budget import SearchBudget
+from board import ROXANNE_TABLE, SQUARE_NAMES, get_flips, get_moves, iter_bits, popcount
+from endgame import DEFAULT_EMPTIES, EndgameSolver, empties, endgame_budget
+from opening_book import DEFAULT_BOOK, load_book
+from parallel_mcts import RootParallelSearch
+
+# 各优先级层的位棋盘掩码，与合法落子位棋盘相与即得该层可下的位置
+ROXANNE_MASKS = tuple(sum(1 << SQUARE_NAMES.index(name) for name in squares) for squares in ROXANNE_TABLE)
+
+
+def roxanne_move(own, opp):
+    """
+    按 Roxanne 优先级选择落子，同一层内随机选择
+    :param own: 行棋方棋子位棋盘
+    :param opp: 对手棋子位棋盘
+    :return: 落子位置（单个位），无子可下时返回 0
+    """
+    moves = get_moves(own, opp)
+    if not moves:
+        return 0
+    for mask in ROXANNE_MASKS:
+        candidates = moves & mask
+        if candidates:
+            if candidates & (candidates - 1):
+                return 1 << random.choice(list(iter_bits(candidates)))
+            return candidates
+    return 0
+
+
+def roxanne_rollout(black, white, color):
+    """
+    双方都按 Roxanne 策略走子直到终局，直接在位棋盘上进行，每步只生成一次合法落子
+    :param color: 先走的一方
+    :return: 0-黑棋赢, 1-白棋赢, 2-平局, 同时返回胜负分差
+    """
+    own, opp = (black, white) if color == 'X' else (white, black)
+    is_black = color == 'X'
+    passes = 0
+    while passes < 2:
+        move = roxanne_move(own, opp)
+        if move:
+            flips = get_flips(move, own, opp)
+            own |= flips | move
+            opp ^= flips
+            passes = 0
+        else:
+            passes += 1
+        own, opp = opp, own
+        is_black = not is_black
+    black_count, white_count = (popcount(own), popcount(opp)) if is_black else (popcount(opp), popcount(own))
+    if black_count > white_count:
+        return 0, black_count - white_count
+    elif black_count < white_count:
+        return 1, white_count - black_count
+    return 2, 0
+
 
 class RoxannePlayer(object):
     def __init__(self, color):
@@ -42,17 +65,7 @@ class RoxannePlayer(object):
         :param color: 执棋方
         """
 
-        self.roxanne_table = [
-            ['A1', 'H1', 'A8', 'H8'],
-            ['C3', 'F3', 'C6', 'F6'],
-            ['C4', 'F4', 'C5', 'F5', 'D3', 'E3', 'D6', 'E6'],
-            ['A3', 'H3', 'A6', 'H6', 'C1', 'F1', 'C8', 'F8'],
-            ['A4', 'H4', 'A5', 'H5', 'D1', 'E1', 'D8', 'E8'],
-            ['B3', 'G3', 'B6', 'G6', 'C2', 'F2', 'C7', 'F7'],
-            ['B4', 'G4', 'B5', 'G5', 'D2', 'E2', 'D7', 'E7'],
-            ['B2', 'G2', 'B7', 'G7'],
-            ['A2', 'H2', 'A7', 'H7', 'B1', 'G1', 'B8', 'G8']
-        ]
+        self.roxanne_table = ROXANNE_TABLE
         self.color = color
 
     def roxanne_select(self, board):
@@ -61,15 +74,11 @@ class RoxannePlayer(object):
         :return: 落子策略
         """
 
-        action_list = list(board.get_legal_actions(self.color))
-        if len(action_list) == 0:
+        op_color = 'O' if self.color == 'X' else 'X'
+        move = roxanne_move(board._bits[self.color], board._bits[op_color])
+        if not move:
             return None
-        else:
-            for move_list in self.roxanne_table:
-                random.shuffle(move_list)
-                for move in move_list:
-                    if move in action_list:
-                        return move
+        return SQUARE_NAMES[move.bit_length() - 1]
 
     def get_move(self, board):
         """
@@ -98,17 +107,37 @@ class AIPlayer:
     AI 玩家
     """
 
-    def __init__(self, color, time_limit = 3, c_param = sqrt(2)):
+    def __init__(self, color, time_limit = 3, c_param = sqrt(2), workers = 1, reuse_tree = True,
+                 adaptive_time = False, max_nodes = None, max_memory_mb = None, endgame_empties = DEFAULT_EMPTIES,
+                 book = DEFAULT_BOOK):
         """
         玩家初始化
         :param color: 下棋方，'X' - 黑棋，'O' - 白棋
+        :param workers: 根并行的进程数，为 1 时在当前进程中单树搜索
+        :param reuse_tree: 是否在相邻两步之间复用搜索树（仅单树搜索）
+        :param adaptive_time: 是否按对局阶段分配每步时间，time_limit 为平均每步时间
+        :param max_nodes: 每步新建节点数上限
+        :param max_memory_mb: 进程内存上限（MB）
+        :param endgame_empties: 空格数不超过此值时改用残局精确求解，为 0 时不使用
+        :param book: 开局库文件，为空或文件不存在时不使用开局库
         """
         self.c_param = c_param
         self.time_limit = time_limit
-        self.tick = 0
-        self.sim_black = RoxannePlayer('X')
-        self.sim_white = RoxannePlayer('O')
+        self.adaptive_time = adaptive_time
+        self.max_nodes = max_nodes
+        self.max_memory_mb = max_memory_mb
+        # 本步的搜索预算，为空时 search_tree 按 time_limit 限时
+        self.budget = None
+        self.node_count = 0
         self.color = color
+        self.parallel = RootParallelSearch(workers) if workers > 1 else None
+        self.reuse_tree = reuse_tree
+        self.endgame_empties = endgame_empties
+        self.endgame = EndgameSolver() if endgame_empties else None
+        self.book = load_book(book)
+        # 上一步搜索树中己方所选走法对应的节点，以及该走法之后的局面
+        self.last_node = None
+        self.last_board = None
 
     def mcts(self, board):
         """
@@ -116,18 +145,7 @@ class AIPlayer:
         :return: 选择最佳拓展
         """
 
-        root = TreeNode(None, self.color)
-
-        # 设定一个时间停止计算，限定规模
-        while time() - self.tick < self.time_limit:
-            sim_board = deepcopy(board)
-            choice = self.select(root, sim_board)
-            self.expand(choice, sim_board)
-            winner, diff = self.simulate(choice, sim_board)
-            back_score = [1, 0, 0.5][winner]
-            if choice.color == 'X':
-                back_score = 1 - back_score
-            self.back_prop(choice, back_score)
+        root = self.search_tree(board, self.reuse_root(board))
 
         best_n = -1
         best_move = None
@@ -135,11 +153,69 @@ class AIPlayer:
             if root.child[k].n > best_n:
                 best_n = root.child[k].n
                 best_move = k
+        if self.reuse_tree and best_move is not None:
+            self.last_node = root.child[best_move]
+            self.last_board = board.clone()
+            self.last_board._move(best_move, self.color)
         return best_move
 
-    def select(self, node, board):
+    def reuse_root(self, board):
+        """
+        在上一步的搜索树中找到对方应手之后的节点作为新的根节点，其余部分随之释放
+        :return: 新的根节点，找不到（如对方停一手或未扩展到该应手）时返回 None
+        """
+        node, last_board = self.last_node, self.last_board
+        self.last_node = self.last_board = None
+        if node is None:
+            return None
+        for move, child in node.child.items():
+            flipped = last_board._move(move, node.color)
+            found = last_board._bits == board._bits
+            last_board.backpropagation(move, flipped, node.color)
+            if found and child.color == self.color:
+                child.parent = None
+                return child
+        return None
+
+    def search_tree(self, board, root=None):
+        """
+        在时间限制范围内建立搜索树
+        :param root: 复用的根节点，为空时新建
+        :return: 根节点
+        """
+
+        if root is None:
+            root = TreeNode(None, self.color)
+
+        # 设定搜索预算，限定规模：每次迭代结束时检查，用完即停止
+        budget = self.budget if self.budget is not None else SearchBudget(time_limit=self.time_limit)
+        self.node_count = 0
+        while True:
+            self.iterate(root, board)
+            if not budget.step(self.node_count):
+                break
+        return root
+
+    def iterate(self, root, board):
+        """
+        一次完整的选择、扩展、模拟与反向传播
+        选择阶段在 board 上原地落子，模拟结束后按相反顺序用 backpropagation 撤销
+        """
+        trace = []
+        choice = self.select(root, board, trace)
+        self.expand(choice, board)
+        winner, diff = self.simulate(choice, board)
+        for move, flipped, color in reversed(trace):
+            board.backpropagation(move, flipped, color)
+        back_score = [1, 0, 0.5][winner]
+        if choice.color == 'X':
+            back_score = 1 - back_score
+        self.back_prop(choice, back_score)
+
+    def select(self, node, board, trace):
         """
         蒙特卡洛树搜索，节点选择
+        :param trace: 记录沿途落子 (落子, 翻转棋子, 颜色)，用于撤销
         :return: 搜索树向下递归选择子节点
         """
 
@@ -162,8 +238,8 @@ class AIPlayer:
                     if score > best_score:
                         best_score = score
                         best_move = k
-            board._move(best_move, node.color)
-            return self.select(node.child[best_move], board)
+            trace.append((best_move, board._move(best_move, node.color), node.color))
+            return self.select(node.child[best_move], board, trace)
 
     def expand(self, node, board):
         """
@@ -172,18 +248,14 @@ class AIPlayer:
         op_color = 'O' if node.color == 'X' else 'X'
         for move in board.get_legal_actions(node.color):
             node.child[move] = TreeNode(node, op_color)
+        self.node_count += len(node.child)
 
     def simulate(self, node, board):
         """
         蒙特卡洛树搜索，采用Roxanne策略代替随机策略搜索，模拟扩展搜索树
         """
 
-        if node.color == 'O':
-            current_player = self.sim_black
-        else:
-            current_player = self.sim_white
-        sim_game = SilentGame(self.sim_black, self.sim_white, board, current_player)
-        return sim_game.run()
+        return roxanne_rollout(board._bits['X'], board._bits['O'], node.color)
 
     def back_prop(self, node, score):
         """
@@ -200,13 +272,57 @@ class AIPlayer:
         :param board: 棋盘
         :return: action 最佳落子位置, e.g. 'A1'
         """
-        self.tick = time()
+        self.budget = SearchBudget.for_move(board, self.time_limit, self.adaptive_time,
+                                            nodes=self.max_nodes, memory_mb=self.max_memory_mb)
         if self.color == 'X':
             player_name = '黑棋'
         else:
             player_name = '白棋'
         print("请等一会，对方 {}-{} 正在思考中...".format(player_name, self.color))
         # -----------------请实现你的算法代码--------------------------------------
-        action = self.mcts(deepcopy(board))
+        if self.book is not None:
+            action = self.book.lookup(board, self.color)
+            if action is not None:
+                return action
+        if self.endgame is not None and empties(board) <= self.endgame_empties:
+            # 残局精确求解，预算用完时退回蒙特卡洛树搜索
+            action = self.endgame.best_move(board, self.color, endgame_budget(self.budget.time_limit))
+            if action is not None:
+                return action
+        if self.parallel is not None:
+            stats = self.parallel.run(root_search, board, self.color, self.budget.time_limit, c_param=self.c_param)
+            # 与单树一致：选择访问次数最多的走法
+            return max(stats, key=lambda k: stats[k][0], default=None)
+        action = self.mcts(board.clone())
         # ------------------------------------------------------------------------
-        return action
\ No newline at end of file
+        return action
+
+    def ponder(self, board, should_stop):
+        """
+        对方思考期间在后台继续搜索：以己方所选走法对应的节点为根扩展同一棵树，直到 should_stop() 为真
+        :param board: 己方落子之后的局面
+        """
+        op_color = 'O' if self.color == 'X' else 'X'
+        if self.parallel is not None or not self.reuse_tree or next(board.get_legal_actions(op_color), None) is None:
+            return
+        if self.endgame is not None and empties(board) <= self.endgame_empties:
+            return
+        root = self.last_node
+        if root is None or root.color != op_color or self.last_board._bits != board._bits:
+            root = TreeNode(None, op_color)
+        root.parent = None
+        self.last_node, self.last_board = root, board.clone()
+        board = board.clone()
+        while not should_stop():
+            for _ in range(4):
+                self.iterate(root, board)
+
+
+def root_search(board, color, time_limit, seed=None, c_param=sqrt(2)):
+    """
+    根并行搜索的工作函数：独立建树并返回根节点各子节点的 (访问次数, 胜率累计)
+    """
+    # 只用于建树，不需要残局求解器与开局库
+    player = AIPlayer(color, time_limit, c_param, endgame_empties=0, book=None)
+    root = player.search_tree(board.clone())
+    return {k: (child.n, child.w) for k, child in root.child.items()}
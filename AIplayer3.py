@@ -1,8 +1,10 @@
 import math
-import copy
+import threading
 import numpy as np
 import random
-from board import Board
+from budget import SearchBudget
+from endgame import DEFAULT_EMPTIES, EndgameSolver, empties, endgame_budget
+from opening_book import DEFAULT_BOOK, load_book
 
 '''
 此为采用神经网络改进探索策略的蒙特卡洛树搜索
@@ -21,7 +23,7 @@ class Node_plus(object):
     '''
     def __init__(self):
         self.color = None
-        self.board = Board()   # 保存当前棋局状态
+        self.board = None      # 保存当前棋局状态（扩展时赋值）
         self.candidate = None  # 该节点对应的走法（格式与 board.get_legal_actions 返回值一致，例如 "D3" ）
         self.visit = 0
         self.score = 0       # 记录累计得分（黑棋赢为 +1 分，白棋赢为 -1 分，平局为 0）
@@ -35,22 +37,83 @@ class Node_plus(object):
         self.nextlocation_prob = None  # 对应各候选走法的先验概率，格式为8x8数组或字典，具体由网络返回
 
 
+class BatchEvaluator(object):
+    '''
+    批量评估器：多个搜索线程提交的待评估棋盘凑成一批后一次送入网络。
+    待评估数量达到 batch_size 或等待超过 max_wait 秒时，由当前线程执行这一批的评估。
+    评估出错时异常会交给这一批的所有线程，由各自的 evaluate 抛出。
+    '''
+    def __init__(self, batch_function, batch_size, max_wait=0.002):
+        self.batch_function = batch_function
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.pending = []    # [(棋盘, 结果槽)]
+        self.cond = threading.Condition()
+
+    def evaluate(self, board):
+        '''
+        提交棋盘并阻塞等待结果，返回 (nextlocation_prob, score)
+        '''
+        slot = []    # 评估完成后放入 (结果, 异常)
+        with self.cond:
+            self.pending.append((board, slot))
+            if len(self.pending) < self.batch_size:
+                self.cond.wait_for(lambda: not self._is_pending(slot), timeout=self.max_wait)
+            if not self._is_pending(slot):
+                # 已由其他线程取走评估
+                self.cond.wait_for(lambda: slot)
+                return self._unpack(slot)
+            batch, self.pending = self.pending, []
+        try:
+            outcomes = [(result, None) for result in self.batch_function([b for b, _ in batch])]
+        except Exception as exc:
+            outcomes = [(None, exc)] * len(batch)
+        with self.cond:
+            for (_, s), outcome in zip(batch, outcomes):
+                s.append(outcome)
+            self.cond.notify_all()
+        return self._unpack(slot)
+
+    @staticmethod
+    def _unpack(slot):
+        result, error = slot[0]
+        if error is not None:
+            raise error
+        return result
+
+    def _is_pending(self, slot):
+        return any(s is slot for _, s in self.pending)
+
+
 class Mcts_plus(object):
     '''
     蒙特卡洛树搜索实现，结合神经网络改进了探索策略。
     参数说明：
       board: 当前棋局状态，必须含有 color 属性（例如 "X" 或 "O"）
       policy_value_function: 神经网络接口，输入 board，返回 (nextlocation_prob, score)
-      r: 搜索迭代次数
+      r: 搜索迭代次数（未给出 budget 时使用）
       is_selfplay: 是否自对弈（1 为自对弈模式，否则为对战模式）
+      n_threads: 搜索线程数，大于 1 时多个线程并发选择叶节点，借助虚拟损失分散到不同分支，
+                 待评估的叶节点合并成一批送入网络
+      batch_function: 批量评估接口，输入棋盘列表，返回 [(nextlocation_prob, score)]；
+                      为空时逐个调用 policy_value_function
+      virtual_loss: 虚拟损失大小
+      root: 复用的根节点（上一步搜索树中与当前局面相同的节点），为空时新建
+      budget: 搜索预算（SearchBudget），为空时限定 r 次迭代
     '''
     
-    def __init__(self, board, policy_value_function, r, is_selfplay=0):
+    def __init__(self, board, policy_value_function, r, is_selfplay=0,
+                 n_threads=1, batch_function=None, virtual_loss=1, root=None, budget=None):
         self.color = board.color 
-        self.board = copy.deepcopy(board)
+        self.board = board.clone()
         self.r = r    # 迭代次数
         self.func = policy_value_function
         self.is_selfplay = is_selfplay
+        self.n_threads = n_threads
+        self.batch_func = batch_function or (lambda boards: [self.func(b) for b in boards])
+        self.virtual_loss = virtual_loss
+        self.root = root
+        self.budget = budget if budget is not None else SearchBudget(iterations=r)
         
     def ucb1(self, node, c=1/math.sqrt(2)): 
         '''
@@ -69,10 +132,15 @@ class Mcts_plus(object):
             best_child_value = -float('inf')
             best_child = None
             for child in selection_node.child:
+                # 尚在等待网络评估的节点不参与选择
+                if child.nextlocation_prob is None:
+                    continue
                 ucb_val = self.ucb1(child)
                 if ucb_val > best_child_value:
                     best_child_value = ucb_val
                     best_child = child
+            if best_child is None:
+                break
             selection_node = best_child
         return selection_node
          
@@ -122,28 +190,26 @@ class Mcts_plus(object):
         通过神经网络评估当前局面，不进行随机完整模拟。
         这里调用策略价值网络，并反转返回的 score（因为网络返回的是对手局面评分）。
         '''
-        board_copy = copy.deepcopy(node.board)
-        # 获取合法走法（调用 get_legal_actions，将生成器转换为 list）
-        board_copy.get_legal_actions(node.board.color)  # 可选：确保局面状态更新
-        # 调用策略价值网络得到先验概率和局面评估
-        node.nextlocation_prob, node.score = self.func(board_copy)
+        # 调用策略价值网络得到先验概率和局面评估（网络只读取棋盘，无需复制）
+        node.nextlocation_prob, node.score = self.func(node.board)
         node.score = -node.score  # 反转视角
        
-    def back_update(self, node):
+    def back_update(self, node, score=None):
         '''
         从当前节点向上回溯，更新访问次数和累计得分
         '''
-        score = node.score
+        if score is None:
+            score = node.score
         while node.parent is not None:
             node.parent.visit += 1
             score = -score  # 反转视角
             node.parent.score += score  
             node = node.parent
 
-    def mcts_run(self):
+    def _new_root(self):
         '''
-        执行蒙特卡洛树搜索。
-        对战模式下返回访问数最高的走法，自对弈模式下返回带噪声的概率分布。
+        新建根节点并完成第一次扩展
+        :return: (根节点, 扩展出的子节点)
         '''
         root = Node_plus()
         root.color = self.color 
@@ -156,7 +222,7 @@ class Mcts_plus(object):
         # 第一次扩展（不进行选择，直接扩展）
         expand_node = self.expand(root)
         # 复制棋盘状态并落子。这里用 _move 代替原来的 reversi_pieces 方法
-        board_copy = copy.deepcopy(self.board)
+        board_copy = self.board.clone()
         board_copy._move(expand_node.candidate, board_copy.color)
         expand_node.board = board_copy
         expand_node.visit = 1
@@ -179,13 +245,33 @@ class Mcts_plus(object):
             else:
                 expand_node.score = -diff
         self.back_update(expand_node)
-        
-        i = 0
-        while i < self.r and expand_node.next_locations:
-            i += 1
+        return root, expand_node
+
+    def mcts_run(self):
+        '''
+        执行蒙特卡洛树搜索。
+        对战模式下返回访问数最高的走法，自对弈模式下返回带噪声的概率分布。
+        '''
+        if self.root is not None:
+            root = expand_node = self.root
+        else:
+            root, expand_node = self._new_root()
+
+        if self.n_threads > 1 and expand_node.next_locations:
+            self.parallel_search(root)
+        # 预算在每次迭代开始前检查，用完后（并行搜索结束后即已用完）不再迭代
+        while expand_node.next_locations and not self.budget.exhausted():
+            self.budget.step()
             selection_node = self.selection(root)
+            if not selection_node.next_locations:
+                # 复用的树中可能含有终局（或需要停一手）的叶节点：重复回传其平均得分
+                score = selection_node.score / selection_node.visit
+                selection_node.visit += 1
+                selection_node.score += score
+                self.back_update(selection_node, score)
+                continue
             expand_node = self.expand(selection_node)
-            board_copy2 = copy.deepcopy(selection_node.board)
+            board_copy2 = selection_node.board.clone()
             board_copy2._move(expand_node.candidate, board_copy2.color)
             expand_node.board = board_copy2
             expand_node.visit = 1
@@ -205,6 +291,7 @@ class Mcts_plus(object):
                 else:
                     expand_node.score = -diff
             self.back_update(expand_node)
+        self.root = root
         
         action = None
         max_visit = 0
@@ -235,21 +322,196 @@ class Mcts_plus(object):
         mcts_prob = softmax(mcts_prob)
         
         return action, mcts_prob
+
+    def parallel_search(self, root):
+        '''
+        多线程搜索，直到预算用完
+        '''
+        self.tree_cond = threading.Condition()
+        self.search_error = None
+        evaluator = BatchEvaluator(self.batch_func, self.n_threads)
+        threads = [threading.Thread(target=self._search_worker, args=(root, evaluator))
+                   for _ in range(self.n_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if self.search_error is not None:
+            # 评估出错：所有线程已退出，在调用线程中抛出
+            raise self.search_error
+
+    def _apply_virtual_loss(self, node, sign):
+        '''
+        在 node 及其祖先上施加（sign=1）或撤销（sign=-1）虚拟损失
+        '''
+        vl = sign * self.virtual_loss
+        while node is not None:
+            node.visit += vl
+            if node.parent is not None:
+                node.score -= vl
+            node = node.parent
+
+    def _search_worker(self, root, evaluator):
+        '''
+        单个搜索线程：加锁选择并扩展，解锁后等待批量评估，再加锁回传结果
+        '''
+        while True:
+            with self.tree_cond:
+                while True:
+                    if self.search_error is not None or self.budget.exhausted():
+                        return
+                    selection_node = self.selection(root)
+                    if selection_node.status == 0 and selection_node.next_locations:
+                        break
+                    if selection_node.status == 0:
+                        # 终局（或需要停一手）的叶节点：重复回传其平均得分
+                        self.budget.step()
+                        score = selection_node.score / selection_node.visit
+                        selection_node.visit += 1
+                        selection_node.score += score
+                        self.back_update(selection_node, score)
+                        continue
+                    # 所有子节点都在等待评估，等其他线程回传后重新选择
+                    self.tree_cond.wait(evaluator.max_wait)
+                self.budget.step()
+                expand_node = self.expand(selection_node)
+                board = selection_node.board.clone()
+                board._move(expand_node.candidate, board.color)
+                board.color = 'O' if expand_node.color == 'X' else 'X'
+                expand_node.board = board
+                self._apply_virtual_loss(expand_node, 1)
+
+            try:
+                nextlocation_prob, score = evaluator.evaluate(board)
+            except Exception as exc:
+                with self.tree_cond:
+                    if self.search_error is None:
+                        self.search_error = exc
+                    self.tree_cond.notify_all()
+                return
+
+            with self.tree_cond:
+                self._apply_virtual_loss(expand_node, -1)
+                expand_node.nextlocation_prob = nextlocation_prob
+                expand_node.score = -score  # 反转视角
+                expand_node.visit = 1
+                expand_node.next_locations = list(board.get_legal_actions(board.color))
+                if sum([board.count(c) for c in ['X', 'O']]) == 64:
+                    winner, diff = board.get_winner()
+                    if expand_node.color == 'X':
+                        expand_node.score = diff
+                    else:
+                        expand_node.score = -diff
+                self.back_update(expand_node)
+                self.tree_cond.notify_all()
 class AIPlayerplus():    # 利用结合神经网络的蒙特卡洛树搜索的AI玩家，迭代次数固定为100次
     '''
     超级电脑玩家
     '''
-    def __init__(self, policy_value_function, mcts_n=400):
+    def __init__(self, policy_value_function, mcts_n=400, n_threads=1, policy_value_batch_function=None,
+                 reuse_tree=True, time_limit=None, adaptive_time=False, max_memory_mb=None,
+                 endgame_empties=DEFAULT_EMPTIES, book=DEFAULT_BOOK):
+        '''
+        :param mcts_n: 每步的模拟次数上限，为 None 时只受时间限制
+        :param time_limit: 每步时间（秒），为 None 时只限定模拟次数
+        :param adaptive_time: 是否按对局阶段分配每步时间
+        :param max_memory_mb: 进程内存上限（MB）
+        :param endgame_empties: 对局中空格数不超过此值时改用残局精确求解，为 0 时不使用（自我对弈不使用）
+        :param book: 对局中使用的开局库文件，为空或文件不存在时不使用（自我对弈不使用）
+        '''
         self.mcts_n = mcts_n
+        self.time_limit = time_limit
+        self.adaptive_time = adaptive_time
+        self.max_memory_mb = max_memory_mb
         self.policy_value_function = policy_value_function
+        self.n_threads = n_threads
+        self.policy_value_batch_function = policy_value_batch_function
+        self.reuse_tree = reuse_tree
+        self.tree = None    # 上一步搜索树的根节点
+        self.endgame_empties = endgame_empties
+        self.endgame = EndgameSolver() if endgame_empties else None
+        self.book = load_book(book)
         
+    def _prepare(self, board):
+        '''
+        复制棋盘并标记行棋方：对局中 Game 设置的是玩家的 color，棋盘本身没有 color 属性
+        '''
+        color = getattr(self, 'color', None) or board.color
+        board = board.clone()
+        board.color = color
+        return board
+
+    def _reuse_root(self, board):
+        '''
+        在上一步搜索树的两层以内找到与当前局面（含行棋方）相同的节点，提升为新的根节点，
+        其余部分随之释放；找不到时返回 None
+        '''
+        root, self.tree = self.tree, None
+        if root is None:
+            return None
+        level = [root]
+        for _ in range(2):
+            level = [child for node in level for child in node.child]
+            for node in level:
+                if (node.board is not None and node.board.color == board.color
+                        and node.board._bits == board._bits and node.next_locations):
+                    node.parent = None
+                    return node
+        return None
+
+    def _search(self, board, is_selfplay):
+        board = self._prepare(board)
+        board.pieces_index()
+        if self.time_limit is None:
+            budget = SearchBudget(iterations=self.mcts_n, memory_mb=self.max_memory_mb)
+        else:
+            budget = SearchBudget.for_move(board, self.time_limit, self.adaptive_time,
+                                           iterations=self.mcts_n, memory_mb=self.max_memory_mb)
+        mcts = Mcts_plus(board, self.policy_value_function, self.mcts_n, is_selfplay,
+                         self.n_threads, self.policy_value_batch_function, root=self._reuse_root(board),
+                         budget=budget)
+        result = mcts.mcts_run()
+        if self.reuse_tree:
+            self.tree = mcts.root
+        return result
+
+    # 后台思考时每轮的模拟次数，两轮之间检查是否停止
+    PONDER_CHUNK = 16
+
+    def ponder(self, board, should_stop):
+        '''
+        对方思考期间在后台继续搜索：以对方待走的局面为根扩展同一棵树，直到 should_stop() 为真
+        :param board: 己方落子之后的局面
+        '''
+        op_color = 'O' if self.color == 'X' else 'X'
+        if not self.reuse_tree or next(board.get_legal_actions(op_color), None) is None:
+            return
+        if self.endgame is not None and empties(board) <= self.endgame_empties:
+            return
+        board = board.clone()
+        board.color = op_color
+        root = self._reuse_root(board)
+        while not should_stop():
+            mcts = Mcts_plus(board, self.policy_value_function, self.PONDER_CHUNK, 0,
+                             self.n_threads, self.policy_value_batch_function, root=root)
+            mcts.mcts_run()
+            root = self.tree = mcts.root
+
     def get_move(self, board):
         '''
         实际用 不传输mcts中数据
         '''
-        board.pieces_index()
-        
-        action1 = Mcts_plus(board, self.policy_value_function, self.mcts_n).mcts_run()
+        color = getattr(self, 'color', None) or board.color
+        if self.book is not None:
+            action = self.book.lookup(board, color)
+            if action is not None:
+                return action
+        if self.endgame is not None and empties(board) <= self.endgame_empties:
+            # 残局精确求解，预算用完时退回蒙特卡洛树搜索
+            action = self.endgame.best_move(board, color, endgame_budget(self.time_limit))
+            if action is not None:
+                return action
+        action1 = self._search(board, 0)
         action = action1[0]
         return action
     
@@ -257,8 +519,6 @@ class AIPlayerplus():    # 利用结合神经网络的蒙特卡洛树搜索的AI
         '''
         自我对战用 需要传输数据
         '''
-        board.pieces_index()
-
-        action = Mcts_plus(board, self.policy_value_function, self.mcts_n, 1).mcts_run()
+        action = self._search(board, 1)
             
         return action
\ No newline at end of file
@@ -0,0 +1,327 @@
+from board import SQUARE_NAMES, SQUARE_TIER, get_flips, get_moves, iter_bits, popcount
+from budget import SearchBudget
+from endgame import DEFAULT_EMPTIES, BudgetExceeded, EndgameSolver, empties, endgame_budget
+from opening_book import DEFAULT_BOOK, load_book
+from symmetry import flip_vertical, mirror_horizontal, transpose
+
+'''
+迭代加深 alpha-beta 搜索玩家。
+搜索：负极大值 alpha-beta，逐层加深直到时间用完；从第二层起以上一层的得分为中心开窄窗口（aspiration window），
+失败时以全窗口重搜；走法排序依次为置换表中的最佳走法、本层的两个杀手走法（killer）、历史启发（history）得分。
+估值：边、角（3x3）、对角线三类模式表加行动力。每种模式的每一种格局编码为 3 进制数（0-空，1-己方，2-对方），
+表在导入时由手工设计的规则对所有格局预先算好，搜索时只需从位棋盘中取出对应的位、查表相加。
+空格数不超过 endgame_empties 时改用残局精确求解（见 endgame.py），开局先查开局库（见 opening_book.py）。
+'''
+
+# 终局时每子的分值，远大于估值的范围
+WIN_SCORE = 2000
+SCORE_INF = 10 ** 6
+
+# 8 位二进制数 --> 对应的 3 进制数（每一位为 1 时该位的 3 进制数字为 1）
+BASE3_8 = [sum(3 ** i for i in range(8) if b >> i & 1) for b in range(256)]
+BASE3_9 = [sum(3 ** i for i in range(9) if b >> i & 1) for b in range(512)]
+
+# 边：A1-H1 每格的分值，角的 100 分由相邻两条边各计一半
+EDGE_WEIGHTS = (50, -10, 10, 5, 5, 10, -10, 50)
+# 从己方占据的角起连续的己方棋子（稳定子）每子的分值：边上、对角线上
+EDGE_STABLE = 15
+DIAGONAL_STABLE = 8
+# 角为空、紧邻角的一串己方棋子之后是对方棋子，对方可以占角
+CORNER_THREAT = 40
+# 角区 3x3（第 r 行第 c 列，r、c 为到角的距离）中不在边上的四格的分值
+X_SQUARE_EMPTY_CORNER = -50
+INNER_WEIGHTS = {(1, 2): -2, (2, 1): -2, (2, 2): -1}
+# 角被己方占据时，角区内部每个己方棋子的分值
+INNER_WITH_CORNER = 3
+# 行动力每步的分值
+MOBILITY_WEIGHT = 8
+
+
+def _cells(code, n):
+    # 3 进制编码 --> 每格的值（0-空，1-己方，2-对方）
+    cells = []
+    for _ in range(n):
+        cells.append(code % 3)
+        code //= 3
+    return cells
+
+
+def _sign(cell):
+    return (0, 1, -1)[cell]
+
+
+def _line_end_value(line, stable_weight):
+    # 一条线从 line[0]（角）一端看：角上的稳定子，或空角旁一串棋子被对方夹住造成的占角威胁
+    corner = line[0]
+    if corner:
+        count = 0
+        for cell in line:
+            if cell != corner:
+                break
+            count += 1
+        return stable_weight * count * _sign(corner)
+    owner = line[1]
+    if owner:
+        for cell in line[2:]:
+            if cell != owner:
+                if cell:
+                    return -CORNER_THREAT * _sign(owner)
+                break
+    return 0
+
+
+def _edge_value(cells):
+    value = sum(w * _sign(cell) for w, cell in zip(EDGE_WEIGHTS, cells))
+    return value + _line_end_value(cells, EDGE_STABLE) + _line_end_value(cells[::-1], EDGE_STABLE)
+
+
+def _corner_value(cells):
+    # 只计不在边上的四格，边上的格子由边模式计算
+    corner = cells[0]
+    value = 0
+    for r, c in ((1, 1), (1, 2), (2, 1), (2, 2)):
+        cell = cells[r * 3 + c]
+        if not cell:
+            continue
+        if corner:
+            value += INNER_WITH_CORNER * _sign(cell) if cell == corner else 0
+        elif (r, c) == (1, 1):
+            value += X_SQUARE_EMPTY_CORNER * _sign(cell)
+        else:
+            value += INNER_WEIGHTS[(r, c)] * _sign(cell)
+    return value
+
+
+def _diagonal_value(cells):
+    return _line_end_value(cells, DIAGONAL_STABLE) + _line_end_value(cells[::-1], DIAGONAL_STABLE)
+
+
+# 模式表：3 进制编码 --> 己方视角的分值
+EDGE_TABLE = [_edge_value(_cells(code, 8)) for code in range(3 ** 8)]
+CORNER_TABLE = [_corner_value(_cells(code, 9)) for code in range(3 ** 9)]
+DIAGONAL_TABLE = [_diagonal_value(_cells(code, 8)) for code in range(3 ** 8)]
+
+DIAGONAL_MASK = 0x8040201008040201
+FULL = 0xFFFFFFFFFFFFFFFF
+
+
+def _corner_bits(x):
+    # A1 角区 3x3 的 9 个位，第 r 行第 c 列 --> 第 r * 3 + c 位
+    return (x & 7) | ((x >> 5) & 0x38) | ((x >> 10) & 0x1C0)
+
+
+def _diagonal_bits(x):
+    # A1-H8 对角线的 8 个位，第 i 列 --> 第 i 位
+    return (((x & DIAGONAL_MASK) * 0x0101010101010101) & FULL) >> 56
+
+
+def evaluate(own, opp):
+    """
+    行棋方视角的局面估值：四条边、四个角区、两条对角线的模式分值加行动力
+    """
+    own_m, opp_m = mirror_horizontal(own), mirror_horizontal(opp)
+    own_f, opp_f = flip_vertical(own), flip_vertical(opp)
+    own_mf, opp_mf = flip_vertical(own_m), flip_vertical(opp_m)
+    own_t, opp_t = transpose(own), transpose(opp)
+    value = (EDGE_TABLE[BASE3_8[own & 0xFF] + 2 * BASE3_8[opp & 0xFF]]
+             + EDGE_TABLE[BASE3_8[own >> 56] + 2 * BASE3_8[opp >> 56]]
+             + EDGE_TABLE[BASE3_8[own_t & 0xFF] + 2 * BASE3_8[opp_t & 0xFF]]
+             + EDGE_TABLE[BASE3_8[own_t >> 56] + 2 * BASE3_8[opp_t >> 56]])
+    for x, y in ((own, opp), (own_m, opp_m), (own_f, opp_f), (own_mf, opp_mf)):
+        value += CORNER_TABLE[BASE3_9[_corner_bits(x)] + 2 * BASE3_9[_corner_bits(y)]]
+    for x, y in ((own, opp), (own_m, opp_m)):
+        value += DIAGONAL_TABLE[BASE3_8[_diagonal_bits(x)] + 2 * BASE3_8[_diagonal_bits(y)]]
+    return value + MOBILITY_WEIGHT * (popcount(get_moves(own, opp)) - popcount(get_moves(opp, own)))
+
+
+class AlphaBetaSearch(object):
+    '''
+    迭代加深 alpha-beta 搜索，置换表与历史启发在多次搜索之间保留
+    '''
+    # 窄窗口的半宽
+    ASPIRATION = 60
+    # 每隔多少个节点检查一次预算
+    CHECK_INTERVAL = 512
+    MAX_PLY = 64
+
+    def __init__(self, table_size=500000):
+        """
+        :param table_size: 置换表容量，超出时清空
+        """
+        self.table_size = table_size
+        self.table = {}
+        self.history = [0] * 64
+        self.killers = [[-1, -1] for _ in range(self.MAX_PLY + 1)]
+        self.nodes = 0
+        self.budget = None
+
+    def search(self, own, opp, budget=None, max_depth=60):
+        """
+        在预算内逐层加深搜索
+        :return: (最佳落子位, 得分, 完成的深度)，没有合法落子时落子位为 0
+        """
+        moves = get_moves(own, opp)
+        if not moves:
+            return 0, 0, 0
+        if len(self.table) > self.table_size:
+            self.table.clear()
+        self.history = [h >> 2 for h in self.history]
+        self.killers = [[-1, -1] for _ in range(self.MAX_PLY + 1)]
+        self.nodes = 0
+        self.budget = budget
+        best_move, best_score, completed = next(iter_bits(moves)), 0, 0
+        max_depth = min(max_depth, 64 - popcount(own | opp))
+        try:
+            for depth in range(1, max_depth + 1):
+                if depth == 1:
+                    score, move = self._root(own, opp, depth, -SCORE_INF, SCORE_INF)
+                else:
+                    alpha, beta = best_score - self.ASPIRATION, best_score + self.ASPIRATION
+                    score, move = self._root(own, opp, depth, alpha, beta)
+                    if score <= alpha or score >= beta:
+                        score, move = self._root(own, opp, depth, -SCORE_INF, SCORE_INF)
+                best_move, best_score, completed = move, score, depth
+                if budget is not None and budget.exhausted():
+                    break
+        except BudgetExceeded:
+            pass
+        finally:
+            self.budget = None
+        return 1 << best_move, best_score, completed
+
+    def _root(self, own, opp, depth, alpha, beta):
+        # 根节点搜索，返回 (得分, 最佳落子位序号)
+        best, best_sq = -SCORE_INF, -1
+        for sq, move, flips in self._ordered(own, opp, get_moves(own, opp), 0):
+            score = -self._negamax(opp ^ flips, own | flips | move, depth - 1, -beta, -max(alpha, best), 1, False)
+            if score > best:
+                best, best_sq = score, sq
+                if best >= beta:
+                    break
+        self._store(own, opp, depth, best, alpha, beta, best_sq)
+        return best, best_sq
+
+    def _ordered(self, own, opp, moves, ply, hint=-1):
+        # 置换表最佳走法、杀手走法、历史得分依次排序，返回 [(位序号, 落子位, 翻转位)]
+        killers = self.killers[ply]
+        history = self.history
+        if hint < 0:
+            entry = self.table.get((own, opp))
+            hint = entry[3] if entry is not None else -1
+        keyed = []
+        for sq in iter_bits(moves):
+            if sq == hint:
+                priority = 3 << 40
+            elif sq == killers[0]:
+                priority = 2 << 40
+            elif sq == killers[1]:
+                priority = 1 << 40
+            else:
+                priority = history[sq] - SQUARE_TIER[sq]
+            keyed.append((-priority, sq))
+        keyed.sort()
+        ordered = []
+        for _, sq in keyed:
+            move = 1 << sq
+            ordered.append((sq, move, get_flips(move, own, opp)))
+        return ordered
+
+    def _store(self, own, opp, depth, score, alpha, beta, best_sq):
+        # 写入置换表：(深度, 下界, 上界, 最佳落子位序号)
+        if score <= alpha:
+            self.table[(own, opp)] = (depth, -SCORE_INF, score, best_sq)
+        elif score >= beta:
+            self.table[(own, opp)] = (depth, score, SCORE_INF, best_sq)
+        else:
+            self.table[(own, opp)] = (depth, score, score, best_sq)
+
+    def _negamax(self, own, opp, depth, alpha, beta, ply, passed):
+        # 负极大值 alpha-beta 搜索，返回行棋方视角的得分
+        self.nodes += 1
+        if self.budget is not None and self.nodes % self.CHECK_INTERVAL == 0 and self.budget.exhausted():
+            raise BudgetExceeded()
+        moves = get_moves(own, opp)
+        if not moves:
+            if passed or not get_moves(opp, own):
+                return WIN_SCORE * (popcount(own) - popcount(opp))
+            return -self._negamax(opp, own, depth, -beta, -alpha, ply + 1, True)
+        if depth <= 0 or ply >= self.MAX_PLY:
+            return evaluate(own, opp)
+
+        hint = -1
+        entry = self.table.get((own, opp))
+        if entry is not None:
+            entry_depth, lower, upper, hint = entry
+            if entry_depth >= depth:
+                if lower >= beta:
+                    return lower
+                if upper <= alpha:
+                    return upper
+                if lower == upper:
+                    return lower
+
+        alpha_orig = alpha
+        best, best_sq = -SCORE_INF, -1
+        for sq, move, flips in self._ordered(own, opp, moves, ply, hint):
+            score = -self._negamax(opp ^ flips, own | flips | move, depth - 1, -beta, -alpha, ply + 1, False)
+            if score > best:
+                best, best_sq = score, sq
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        killers = self.killers[ply]
+                        if killers[0] != sq:
+                            killers[1], killers[0] = killers[0], sq
+                        self.history[sq] += depth * depth
+                        break
+        self._store(own, opp, depth, best, alpha_orig, beta, best_sq)
+        return best
+
+
+class AIPlayer:
+    def __init__(self, color, time_limit=3, adaptive_time=False, max_depth=60, table_size=500000,
+                 endgame_empties=DEFAULT_EMPTIES, book=DEFAULT_BOOK):
+        """
+        :param color: 下棋方，'X' - 黑棋，'O' - 白棋
+        :param time_limit: 每步时间（秒）
+        :param adaptive_time: 是否按对局阶段分配每步时间，time_limit 为平均每步时间
+        :param max_depth: 最大搜索深度
+        :param table_size: 置换表容量
+        :param endgame_empties: 空格数不超过此值时改用残局精确求解，为 0 时不使用
+        :param book: 开局库文件，为空或文件不存在时不使用开局库
+        """
+        self.color = color.upper()
+        self.time_limit = time_limit
+        self.adaptive_time = adaptive_time
+        self.max_depth = max_depth
+        self.searcher = AlphaBetaSearch(table_size)
+        self.endgame_empties = endgame_empties
+        self.endgame = EndgameSolver() if endgame_empties else None
+        self.book = load_book(book)
+        # 上一步完成的搜索深度与搜索的节点数
+        self.depth = 0
+        self.nodes = 0
+
+    def get_move(self, board):
+        """
+        根据当前棋盘状态获取最佳落子位置
+        :return: 落子坐标，例如 'A1'；无子可下时返回 None
+        """
+        print("请稍后，{}正在思考".format("黑棋(X)" if self.color == 'X' else "白棋(O)"))
+        if self.book is not None:
+            move = self.book.lookup(board, self.color)
+            if move is not None:
+                return move
+        budget = SearchBudget.for_move(board, self.time_limit, self.adaptive_time)
+        if self.endgame is not None and empties(board) <= self.endgame_empties:
+            # 残局精确求解，预算用完时退回 alpha-beta 搜索
+            move = self.endgame.best_move(board, self.color, endgame_budget(budget.time_limit))
+            if move is not None:
+                return move
+        op_color = 'O' if self.color == 'X' else 'X'
+        move, _, self.depth = self.searcher.search(board._bits[self.color], board._bits[op_color], budget,
+                                                   self.max_depth)
+        self.nodes = self.searcher.nodes
+        if not move:
+            return None
+        return SQUARE_NAMES[move.bit_length() - 1]
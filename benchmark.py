@@ -0,0 +1,285 @@
+import argparse
+import contextlib
+import io
+from time import time
+from board import Board
+
+'''
+性能测试脚本，使用方法：
+    python benchmark.py parallel --player 1 --workers 1 2 4 8 --time 1 --games 4
+    python benchmark.py inference --model best_policy.model --batch-sizes 1 8 32 128
+    python benchmark.py ponder --player mcts --time 1 --games 4
+    python benchmark.py quantize --model best_policy.model --data selfplay_data --games 4 --mcts-n 200
+    python benchmark.py endgame --empties 10 12 14 --positions 5
+'''
+
+
+def play_match(black_player, white_player, board=None):
+    """
+    不打印棋盘地进行一局对弈
+    :return: 0-黑棋赢, 1-白棋赢, 2-平局, 胜负分差
+    """
+    board = Board() if board is None else board
+    black_player.color, white_player.color = 'X', 'O'
+    players = {'X': black_player, 'O': white_player}
+    color = 'X'
+    # 屏蔽玩家思考时的打印信息
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not board.is_game_over():
+            if next(board.get_legal_actions(color), None) is not None:
+                board._move(players[color].get_move(board), color)
+            color = 'O' if color == 'X' else 'X'
+    return board.get_winner()
+
+
+def match_score(make_player, make_opponent, games):
+    """
+    两种玩家交换先后手对弈，返回前者的得分率（胜 1 分，平 0.5 分）
+    """
+    score = 0
+    for i in range(games):
+        player, opponent = make_player(), make_opponent()
+        if i % 2 == 0:
+            winner, _ = play_match(player, opponent)
+            score += [1, 0, 0.5][winner]
+        else:
+            winner, _ = play_match(opponent, player)
+            score += [0, 1, 0.5][winner]
+        for p in (player, opponent):
+            if getattr(p, 'parallel', None) is not None:
+                p.parallel.shutdown()
+            if hasattr(p, 'close'):
+                p.close()
+    return score / games if games else 0
+
+
+def bench_parallel(args):
+    """
+    根并行搜索：不同进程数下的根节点访问速度与对单进程的得分率
+    """
+    from parallel_mcts import RootParallelSearch
+    if args.player == 1:
+        from AIplayer1 import AIPlayer, root_search
+    else:
+        from AIplayer2 import AIPlayer, root_search
+    board = Board()
+    board._move('D3', 'X')
+    print('workers  visits/s  score_vs_1_worker')
+    for workers in args.workers:
+        search = RootParallelSearch(workers)
+        # 预热进程池，避免把进程启动时间计入
+        search.run(root_search, board, 'O', 0.1)
+        start = time()
+        stats = search.run(root_search, board, 'O', args.time)
+        elapsed = time() - start
+        search.shutdown()
+        visits = sum(n for n, _ in stats.values())
+        # 关闭残局求解与开局库，得分只反映根并行的效果
+        score = match_score(lambda: AIPlayer('X', workers=workers, time_limit=args.time, endgame_empties=0, book=None),
+                            lambda: AIPlayer('X', workers=1, time_limit=args.time, endgame_empties=0, book=None),
+                            args.games) if workers > 1 else 0.5
+        print('{:7d}  {:8.0f}  {:17.2f}'.format(workers, visits / elapsed, score))
+
+
+def bench_ponder(args):
+    """
+    后台思考：同一种玩家在相同每步时间下，后台思考一方对不后台思考一方的得分率
+    对方需运行在另一个 CPU 核上，否则后台思考会占用对方的计算时间
+    """
+    from players import player_options, create_player, create_pondering_player
+    # 关闭残局求解与开局库，否则双方在开局和残局的落子相同，得分低估后台思考的效果
+    options = player_options(time=args.time, mcts_n=args.mcts_n, endgame_empties=0, book=None)
+    score = match_score(lambda: create_pondering_player(args.player, 'X', options, quiet=True),
+                        lambda: create_player(args.player, 'X', options), args.games)
+    print('{} 后台思考对不后台思考的得分率: {:.2f}（{} 局，每步 {} 秒）'.format(
+        args.player, score, args.games, args.time))
+
+
+def bench_inference(args):
+    """
+    原始网络与 TorchScript 优化后的推理模块在不同批大小下的单批延迟
+    """
+    import numpy as np
+    import torch
+    from policy_value_net import PolicyValueNet
+    eager = PolicyValueNet(model_file=args.model)
+    start = time()
+    optimized = PolicyValueNet(model_file=args.model, optimize=True)
+    print('优化与预热用时: {:.1f} ms'.format((time() - start) * 1000))
+    print('batch  eager_ms  optimized_ms  speedup  max_abs_diff')
+    for batch_size in args.batch_sizes:
+        state_batch = torch.from_numpy(np.random.randint(0, 2, (batch_size, 2, 8, 8)).astype(np.float32))
+        latency, outputs = {}, {}
+        with torch.inference_mode():
+            for name, net in (('eager', eager.inference_net()), ('optimized', optimized.inference_net(batch_size))):
+                for _ in range(args.warmup):
+                    net(state_batch)
+                start = time()
+                for _ in range(args.repeat):
+                    outputs[name] = net(state_batch)
+                latency[name] = (time() - start) / args.repeat * 1000
+        diff = max((a - b).abs().max().item() for a, b in zip(outputs['eager'], outputs['optimized']))
+        print('{:5d}  {:8.3f}  {:12.3f}  {:6.2f}x  {:12.2e}'.format(
+            batch_size, latency['eager'], latency['optimized'], latency['eager'] / latency['optimized'], diff))
+
+
+def load_positions(data_dir, n, seed=0):
+    """
+    从自我对弈分片中随机取 n 个局面；没有数据时用随机对弈采样
+    """
+    import numpy as np
+    from quantized_net import sample_positions
+    if data_dir:
+        from selfplay import list_shards, open_shard
+        shards = [open_shard(path)['state'] for path in list_shards(data_dir)]
+        if shards:
+            states = np.concatenate(shards)
+            idx = np.random.default_rng(seed).choice(len(states), min(n, len(states)), replace=False)
+            return states[idx].astype(np.float32)
+    return sample_positions(n, seed)
+
+
+def bench_quantize(args):
+    """
+    int8 量化网络相对浮点网络的精度（策略 KL 散度、价值均方误差、对弈得分率）与推理速度
+    """
+    import numpy as np
+    import torch
+    from policy_value_net import PolicyValueNet
+    from quantized_net import QuantizedPolicyValueNet
+    from AIplayer3 import AIPlayerplus
+    calibration = load_positions(args.data, args.calibration, seed=0)
+    evaluation = torch.from_numpy(load_positions(args.data, args.positions, seed=1))
+    float_net = PolicyValueNet(model_file=args.model)
+    quant_net = QuantizedPolicyValueNet(model_file=args.model, calibration_states=calibration)
+    with torch.inference_mode():
+        log_p, v = float_net.inference_net()(evaluation)
+        log_q, w = quant_net.inference_net()(evaluation)
+    kl = (log_p.exp() * (log_p - log_q)).sum(dim=1).mean().item()
+    mse = ((v - w) ** 2).mean().item()
+    top1 = (log_p.argmax(dim=1) == log_q.argmax(dim=1)).float().mean().item()
+    print('校准局面: {}  评估局面: {}'.format(len(calibration), len(evaluation)))
+    print('策略 KL(float||int8): {:.5f}  最大概率落子一致率: {:.3f}  价值 MSE: {:.6f}'.format(kl, top1, mse))
+
+    print('batch  float_pos/s  int8_pos/s  speedup')
+    for batch_size in args.batch_sizes:
+        state_batch = evaluation[:batch_size].repeat((batch_size - 1) // len(evaluation) + 1, 1, 1, 1)[:batch_size]
+        speed = []
+        with torch.inference_mode():
+            for net in (float_net.inference_net(), quant_net.inference_net()):
+                for _ in range(args.warmup):
+                    net(state_batch)
+                start = time()
+                for _ in range(args.repeat):
+                    net(state_batch)
+                speed.append(batch_size * args.repeat / (time() - start))
+        print('{:5d}  {:11.0f}  {:10.0f}  {:6.2f}x'.format(batch_size, speed[0], speed[1], speed[1] / speed[0]))
+
+    if args.games:
+        # 关闭残局求解与开局库，使每一步都由网络决定，得分只反映两个网络的差别
+        score = match_score(lambda: AIPlayerplus(quant_net.policy_value_fn, args.mcts_n, endgame_empties=0, book=None),
+                            lambda: AIPlayerplus(float_net.policy_value_fn, args.mcts_n, endgame_empties=0, book=None),
+                            args.games)
+        print('int8 对 float 得分率: {:.2f}（{} 局，每步 {} 次模拟）'.format(score, args.games, args.mcts_n))
+
+
+def endgame_positions(n_empty, count, seed=0):
+    """
+    用随机种子可复现地生成 count 个恰有 n_empty 个空格、未终局的局面：双方各以一半概率按 Roxanne 策略或随机落子
+    :return: [(棋盘, 行棋方)]
+    """
+    import random
+    from AIplayer2 import RoxannePlayer
+    from endgame import empties
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board, color = Board(), 'X'
+        while empties(board) > n_empty and not board.is_game_over():
+            actions = list(board.get_legal_actions(color))
+            if actions:
+                action = RoxannePlayer(color).get_move(board) if rng.random() < 0.5 else rng.choice(actions)
+                board._move(action, color)
+            color = 'O' if color == 'X' else 'X'
+        if empties(board) == n_empty and not board.is_game_over():
+            if next(board.get_legal_actions(color), None) is None:
+                color = 'O' if color == 'X' else 'X'
+            positions.append((board, color))
+    return positions
+
+
+def bench_endgame(args):
+    """
+    残局精确求解：每个局面的结果、节点数与每秒节点数
+    """
+    from budget import SearchBudget
+    from endgame import EndgameSolver
+    print('empties  #  color  score  move       nodes   time(s)   nodes/s')
+    for n_empty in args.empties:
+        total_nodes = total_time = 0
+        for i, (board, color) in enumerate(endgame_positions(n_empty, args.positions, args.seed)):
+            solver = EndgameSolver()
+            budget = SearchBudget(time_limit=args.time_limit, nodes=args.max_nodes)
+            start = time()
+            result = solver.solve(board, color, budget)
+            elapsed = time() - start
+            total_nodes += solver.nodes
+            total_time += elapsed
+            score, move = result if result is not None else ('-', '超出预算')
+            print('{:7d} {:2d}  {:>5s}  {:>5}  {:4s} {:10d} {:9.2f} {:9.0f}'.format(
+                n_empty, i, color, score, str(move), solver.nodes, elapsed, solver.nodes / max(elapsed, 1e-9)))
+        print('{} 空合计: {} 个节点，{:.2f} 秒，{:.0f} 节点/秒'.format(
+            n_empty, total_nodes, total_time, total_nodes / max(total_time, 1e-9)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='黑白棋 AI 性能测试')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('parallel', help='根并行 MCTS 的访问速度与棋力')
+    p.add_argument('--player', type=int, choices=[1, 2], default=1, help='AIplayer1 或 AIplayer2')
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    p.add_argument('--time', type=float, default=1.0, help='每步搜索时间（秒）')
+    p.add_argument('--games', type=int, default=4, help='每个进程数下的对局数')
+    p.set_defaults(func=bench_parallel)
+
+    p = sub.add_parser('ponder', help='后台思考对棋力的影响')
+    p.add_argument('--player', default='mcts', help='玩家名，见 main.py --list')
+    p.add_argument('--time', type=float, default=1.0, help='每步搜索时间（秒）')
+    p.add_argument('--mcts-n', type=int, default=400, help='net 玩家每步的模拟次数')
+    p.add_argument('--games', type=int, default=4)
+    p.set_defaults(func=bench_ponder)
+
+    p = sub.add_parser('inference', help='原始网络与优化推理模块的延迟对比')
+    p.add_argument('--model', default='best_policy.model')
+    p.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    p.add_argument('--repeat', type=int, default=200, help='每个批大小的计时次数')
+    p.add_argument('--warmup', type=int, default=10, help='计时前的预热次数')
+    p.set_defaults(func=bench_inference)
+
+    p = sub.add_parser('quantize', help='int8 量化网络的精度与速度')
+    p.add_argument('--model', default='best_policy.model')
+    p.add_argument('--data', default=None, help='自我对弈分片目录，为空时用随机对弈局面')
+    p.add_argument('--calibration', type=int, default=2000, help='校准局面数')
+    p.add_argument('--positions', type=int, default=2000, help='评估局面数')
+    p.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    p.add_argument('--repeat', type=int, default=100)
+    p.add_argument('--warmup', type=int, default=10)
+    p.add_argument('--games', type=int, default=4, help='int8 与 float 网络的对局数')
+    p.add_argument('--mcts-n', type=int, default=200, help='对局时每步的模拟次数')
+    p.set_defaults(func=bench_quantize)
+
+    p = sub.add_parser('endgame', help='残局精确求解的速度')
+    p.add_argument('--empties', type=int, nargs='+', default=[10, 12, 14], help='局面的空格数')
+    p.add_argument('--positions', type=int, default=5, help='每个空格数的局面数')
+    p.add_argument('--seed', type=int, default=0, help='生成局面的随机种子')
+    p.add_argument('--time-limit', type=float, default=None, help='每个局面的求解时间上限（秒）')
+    p.add_argument('--max-nodes', type=int, default=None, help='每个局面的节点数上限')
+    p.set_defaults(func=bench_endgame)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
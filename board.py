@@ -1,200 +1,462 @@
-class Board(object):
-    """
-    Board 黑白棋棋盘，规格是8*8，黑棋用 X 表示，白棋用 O 表示，未落子时用 . 表示。
-    """
-
-    def __init__(self):
-        """
-        初始化棋盘状态
-        """
-        self.empty = '.'  # 未落子状态
-        self._board = [[self.empty for _ in range(8)] for _ in range(8)]
-        self._board[3][4] = 'X'
-        self._board[4][3] = 'X'
-        self._board[3][3], self._board[4][4] = 'O', 'O'
-        # 初始化棋子计数
-        self.pieces_index()  
-
-    def __getitem__(self, index):
-        """
-        添加 Board[][] 索引语法
-        """
-        return self._board[index]
-
-    def display(self, step_time=None, total_time=None):
-        """
-        打印棋盘
-        """
-        board = self._board
-        print(' ', ' '.join(list('ABCDEFGH')))
-        for i in range(8):
-            print(str(i + 1), ' '.join(board[i]))
-        if (not step_time) or (not total_time):
-            step_time = {"X": 0, "O": 0}
-            total_time = {"X": 0, "O": 0}
-            print("统计棋局: 棋子总数 / 每一步耗时 / 总时间 ")
-            print("黑   棋: " + str(self.count('X')) + ' / ' + str(step_time['X']) + ' / ' + str(total_time['X']))
-            print("白   棋: " + str(self.count('O')) + ' / ' + str(step_time['O']) + ' / ' + str(total_time['O']) + '\n')
-        else:
-            print("统计棋局: 棋子总数 / 每一步耗时 / 总时间 ")
-            print("黑   棋: " + str(self.count('X')) + ' / ' + str(step_time['X']) + ' / ' + str(total_time['X']))
-            print("白   棋: " + str(self.count('O')) + ' / ' + str(step_time['O']) + ' / ' + str(total_time['O']) + '\n')
-
-    def count(self, color):
-        """
-        统计 color 一方棋子的数量。(O:白棋, X:黑棋, .:未落子状态)
-        """
-        count = 0
-        for y in range(8):
-            for x in range(8):
-                if self._board[x][y] == color:
-                    count += 1
-        return count
-
-    def pieces_index(self):
-        """
-        更新棋盘上的棋子统计数据。
-        将黑棋和白棋的数量分别保存到属性 black_count 和 white_count 中。
-        """
-        self.black_count = self.count('X')
-        self.white_count = self.count('O')
-
-    def get_winner(self):
-        """
-        通过棋子的个数判断胜负
-        :return: 0-黑棋赢, 1-白棋赢, 2-平局, 同时返回胜负分差
-        """
-        black_count, white_count = 0, 0
-        for i in range(8):
-            for j in range(8):
-                if self._board[i][j] == 'X':
-                    black_count += 1
-                if self._board[i][j] == 'O':
-                    white_count += 1
-        if black_count > white_count:
-            return 0, black_count - white_count
-        elif black_count < white_count:
-            return 1, white_count - black_count
-        else:
-            return 2, 0
-
-    def _move(self, action, color):
-        """
-        落子并返回翻转棋子的坐标列表
-        """
-        if isinstance(action, str):
-            action = self.board_num(action)
-        fliped = self._can_fliped(action, color)
-        if fliped:
-            for flip in fliped:
-                x, y = self.board_num(flip)
-                self._board[x][y] = color
-            x, y = action
-            self._board[x][y] = color
-            # 更新棋子计数信息
-            self.pieces_index()
-            return fliped
-        else:
-            return False
-
-    def backpropagation(self, action, flipped_pos, color):
-        """
-        回溯操作，撤销落子
-        """
-        if isinstance(action, str):
-            action = self.board_num(action)
-        self._board[action[0]][action[1]] = self.empty
-        op_color = "O" if color == "X" else "X"
-        for p in flipped_pos:
-            if isinstance(p, str):
-                p = self.board_num(p)
-            self._board[p[0]][p[1]] = op_color
-        self.pieces_index()
-
-    def is_on_board(self, x, y):
-        """
-        判断坐标是否在棋盘范围内
-        """
-        return 0 <= x < 8 and 0 <= y < 8
-
-    def _can_fliped(self, action, color):
-        """
-        判断落子是否合法，返回翻转子坐标列表或 False
-        """
-        if isinstance(action, str):
-            action = self.board_num(action)
-        xstart, ystart = action
-        if not self.is_on_board(xstart, ystart) or self._board[xstart][ystart] != self.empty:
-            return False
-        self._board[xstart][ystart] = color
-        op_color = "O" if color == "X" else "X"
-        flipped_pos = []
-        flipped_pos_board = []
-        for xdirection, ydirection in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
-            x, y = xstart, ystart
-            x += xdirection
-            y += ydirection
-            if self.is_on_board(x, y) and self._board[x][y] == op_color:
-                x += xdirection
-                y += ydirection
-                if not self.is_on_board(x, y):
-                    continue
-                while self._board[x][y] == op_color:
-                    x += xdirection
-                    y += ydirection
-                    if not self.is_on_board(x, y):
-                        break
-                if not self.is_on_board(x, y):
-                    continue
-                if self._board[x][y] == color:
-                    while True:
-                        x -= xdirection
-                        y -= ydirection
-                        if x == xstart and y == ystart:
-                            break
-                        flipped_pos.append([x, y])
-        self._board[xstart][ystart] = self.empty  # 恢复空位
-        if len(flipped_pos) == 0:
-            return False
-        for fp in flipped_pos:
-            flipped_pos_board.append(self.num_board(fp))
-        return flipped_pos_board
-
-    def get_legal_actions(self, color):
-        """
-        根据棋规获取合法落子坐标
-        """
-        direction = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
-        op_color = "O" if color == "X" else "X"
-        op_color_near_points = []
-        board = self._board
-        for i in range(8):
-            for j in range(8):
-                if board[i][j] == op_color:
-                    for dx, dy in direction:
-                        x, y = i + dx, j + dy
-                        if 0 <= x < 8 and 0 <= y < 8 and board[x][y] == self.empty and (x, y) not in op_color_near_points:
-                            op_color_near_points.append((x, y))
-        l = list(range(8))
-        for p in op_color_near_points:
-            if self._can_fliped(p, color):
-                if p[0] in l and p[1] in l:
-                    p = self.num_board(p)
-                yield p
-
-    def board_num(self, action):
-        """
-        棋盘坐标转数字坐标，例如 A1 --> (0,0)
-        """
-        row, col = str(action[1]).upper(), str(action[0]).upper()
-        if row in '12345678' and col in 'ABCDEFGH':
-            x, y = '12345678'.index(row), 'ABCDEFGH'.index(col)
-            return x, y
-
-    def num_board(self, action):
-        """
-        数字坐标转棋盘坐标，例如 (0,0) --> A1
-        """
-        row, col = action
-        if col in range(8) and row in range(8):
-            return chr(ord('A') + col) + str(row + 1)
+import random
+
+FULL = 0xFFFFFFFFFFFFFFFF   # 64 位全 1 掩码
+INNER = 0x7E7E7E7E7E7E7E7E  # 去掉 A、H 两列的掩码，横向/斜向移位时防止跨行回绕
+COL_A = 0x0101010101010101  # A 列
+COL_H = 0x8080808080808080  # H 列
+
+# 位棋盘方向：(移位量, 是否需要屏蔽边列)，左移与右移各对应一个方向
+# 第 x 行第 y 列对应第 x * 8 + y 位，例如 A1 --> 第 0 位，H8 --> 第 63 位
+DIRECTIONS = ((1, True), (8, False), (7, True), (9, True))
+
+# 位序号 --> 棋盘坐标，例如 0 --> 'A1'
+SQUARE_NAMES = [chr(ord('A') + sq % 8) + str(sq // 8 + 1) for sq in range(64)]
+
+OPPONENT = {'X': 'O', 'O': 'X'}
+
+# Roxanne 落子优先级表，从上到下优先级依次降低
+ROXANNE_TABLE = (
+    ('A1', 'H1', 'A8', 'H8'),
+    ('C3', 'F3', 'C6', 'F6'),
+    ('C4', 'F4', 'C5', 'F5', 'D3', 'E3', 'D6', 'E6'),
+    ('A3', 'H3', 'A6', 'H6', 'C1', 'F1', 'C8', 'F8'),
+    ('A4', 'H4', 'A5', 'H5', 'D1', 'E1', 'D8', 'E8'),
+    ('B3', 'G3', 'B6', 'G6', 'C2', 'F2', 'C7', 'F7'),
+    ('B4', 'G4', 'B5', 'G5', 'D2', 'E2', 'D7', 'E7'),
+    ('B2', 'G2', 'B7', 'G7'),
+    ('A2', 'H2', 'A7', 'H7', 'B1', 'G1', 'B8', 'G8'),
+)
+
+# 位序号 --> Roxanne 优先级（层号越小越优先，中心四格不会落子）
+SQUARE_TIER = [next((tier for tier, squares in enumerate(ROXANNE_TABLE) if name in squares), len(ROXANNE_TABLE))
+               for name in SQUARE_NAMES]
+
+
+def _zobrist_tables(seed=20240601):
+    """
+    生成 Zobrist 随机键。为了在常数时间内计算任意位棋盘的键，按字节预先合并：
+    table[k][b] 为第 k 个字节取值 b 时，其中所有位对应随机键的异或。
+    """
+    rng = random.Random(seed)
+    keys = {color: [rng.getrandbits(64) for _ in range(64)] for color in ('X', 'O')}
+    tables = {}
+    for color in ('X', 'O'):
+        lanes = []
+        for k in range(8):
+            lane = [0] * 256
+            for b in range(1, 256):
+                low = b & -b
+                lane[b] = lane[b ^ low] ^ keys[color][k * 8 + low.bit_length() - 1]
+            lanes.append(lane)
+        tables[color] = lanes
+    # 翻转棋子时同一格由一方变为另一方，两者的键可以预先异或
+    tables['flip'] = [[x ^ o for x, o in zip(tables['X'][k], tables['O'][k])] for k in range(8)]
+    return keys, tables, rng.getrandbits(64)
+
+
+ZOBRIST_KEYS, ZOBRIST_TABLES, ZOBRIST_SIDE = _zobrist_tables()
+
+
+def zobrist(bits, table):
+    """
+    按字节查表计算位棋盘的 Zobrist 键
+    :param bits: 位棋盘
+    :param table: ZOBRIST_TABLES 中的某一张表
+    """
+    h = 0
+    for lane in table:
+        if bits & 0xFF:
+            h ^= lane[bits & 0xFF]
+        bits >>= 8
+        if not bits:
+            break
+    return h
+
+
+def popcount(x):
+    """
+    统计位棋盘中 1 的个数
+    """
+    return bin(x).count('1')
+
+
+def get_moves(own, opp, targets=None):
+    """
+    移位-掩码法生成合法落子位棋盘
+    :param own: 行棋方棋子位棋盘
+    :param opp: 对手棋子位棋盘
+    :param targets: 候选落子位置，默认为全部空位（可传入边界空位集合）
+    :return: 合法落子位置的位棋盘
+    """
+    empty = ~(own | opp) & FULL if targets is None else targets
+    moves = 0
+    for shift, edge in DIRECTIONS:
+        mask = opp & INNER if edge else opp
+        # 左移方向
+        t = (own << shift) & mask
+        t |= (t << shift) & mask
+        t |= (t << shift) & mask
+        t |= (t << shift) & mask
+        t |= (t << shift) & mask
+        t |= (t << shift) & mask
+        moves |= t << shift
+        # 右移方向
+        t = (own >> shift) & mask
+        t |= (t >> shift) & mask
+        t |= (t >> shift) & mask
+        t |= (t >> shift) & mask
+        t |= (t >> shift) & mask
+        t |= (t >> shift) & mask
+        moves |= t >> shift
+    return moves & empty
+
+
+def get_flips(move, own, opp):
+    """
+    计算在 move 处落子后被翻转的棋子
+    :param move: 落子位置（单个位）
+    :param own: 行棋方棋子位棋盘
+    :param opp: 对手棋子位棋盘
+    :return: 被翻转棋子的位棋盘，0 表示不能翻转任何棋子
+    """
+    flips = 0
+    for shift, edge in DIRECTIONS:
+        mask = opp & INNER if edge else opp
+        # 左移方向
+        x = (move << shift) & mask
+        f = 0
+        while x:
+            f |= x
+            x <<= shift
+            if x & own:
+                flips |= f
+                break
+            x &= mask
+        # 右移方向
+        x = (move >> shift) & mask
+        f = 0
+        while x:
+            f |= x
+            x >>= shift
+            if x & own:
+                flips |= f
+                break
+            x &= mask
+    return flips
+
+
+def neighbours(x):
+    """
+    返回位棋盘 x 中所有棋子的八邻域（不含 x 本身）
+    """
+    h = ((x << 1) & ~COL_A) | ((x >> 1) & ~COL_H)
+    row = x | h
+    return (h | (row << 8) | (row >> 8)) & FULL & ~x
+
+
+def iter_bits(x):
+    """
+    依次返回位棋盘中每个 1 所在的位序号
+    """
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
+
+class Board(object):
+    """
+    Board 黑白棋棋盘，规格是8*8，黑棋用 X 表示，白棋用 O 表示，未落子时用 . 表示。
+    内部使用两个 64 位整数（位棋盘）分别保存黑棋与白棋的位置。
+    """
+
+    def __init__(self):
+        """
+        初始化棋盘状态
+        """
+        self.empty = '.'  # 未落子状态
+        # 黑棋 D5、E4，白棋 D4、E5
+        self._bits = {'X': (1 << 28) | (1 << 35), 'O': (1 << 27) | (1 << 36)}
+        # 与棋子相邻的空位集合（边界空位），合法落子只可能出现在其中
+        self._frontier = neighbours(self._bits['X'] | self._bits['O'])
+        # 按颜色缓存的合法落子位棋盘，棋盘变化时清空
+        self._legal = {}
+        # 落子历史，保存撤销时需要恢复的 (落子位, 翻转位, 颜色, 边界空位, 合法落子缓存)
+        self._history = []
+        # 局面的 Zobrist 键，随落子增量更新
+        self._hash = zobrist(self._bits['X'], ZOBRIST_TABLES['X']) ^ zobrist(self._bits['O'], ZOBRIST_TABLES['O'])
+        # 初始化棋子计数
+        self.pieces_index()
+
+    def clone(self):
+        """
+        快速复制棋盘。位棋盘只是若干整数，复制代价与棋子数量无关；
+        落子历史不复制，复制出的棋盘撤销更早的落子时会重新计算边界空位。
+        """
+        board = Board.__new__(Board)
+        board.__dict__.update(self.__dict__)
+        board._bits = dict(self._bits)
+        board._legal = dict(self._legal)
+        board._history = []
+        return board
+
+    @classmethod
+    def from_bits(cls, black, white):
+        """
+        由黑白双方的位棋盘构造棋盘（没有落子历史）
+        """
+        board = cls.__new__(cls)
+        board.empty = '.'
+        board._bits = {'X': black, 'O': white}
+        board._frontier = neighbours(black | white)
+        board._legal = {}
+        board._history = []
+        board._hash = zobrist(black, ZOBRIST_TABLES['X']) ^ zobrist(white, ZOBRIST_TABLES['O'])
+        board.pieces_index()
+        return board
+
+    def __deepcopy__(self, memo):
+        """
+        deepcopy 直接使用 clone，保留玩家在棋盘上附加的属性（例如 color）
+        """
+        return self.clone()
+
+    @property
+    def _board(self):
+        """
+        由位棋盘生成 8*8 的字符二维列表，兼容原有的列表棋盘接口
+        """
+        return [self._row(i) for i in range(8)]
+
+    def _row(self, i):
+        """
+        生成第 i 行的字符列表
+        """
+        black, white = self._bits['X'] >> (i * 8), self._bits['O'] >> (i * 8)
+        return ['X' if black >> j & 1 else 'O' if white >> j & 1 else self.empty for j in range(8)]
+
+    def __getitem__(self, index):
+        """
+        添加 Board[][] 索引语法
+        """
+        return self._row(index)
+
+    def display(self, step_time=None, total_time=None):
+        """
+        打印棋盘
+        """
+        board = self._board
+        print(' ', ' '.join(list('ABCDEFGH')))
+        for i in range(8):
+            print(str(i + 1), ' '.join(board[i]))
+        if (not step_time) or (not total_time):
+            step_time = {"X": 0, "O": 0}
+            total_time = {"X": 0, "O": 0}
+            print("统计棋局: 棋子总数 / 每一步耗时 / 总时间 ")
+            print("黑   棋: " + str(self.count('X')) + ' / ' + str(step_time['X']) + ' / ' + str(total_time['X']))
+            print("白   棋: " + str(self.count('O')) + ' / ' + str(step_time['O']) + ' / ' + str(total_time['O']) + '\n')
+        else:
+            print("统计棋局: 棋子总数 / 每一步耗时 / 总时间 ")
+            print("黑   棋: " + str(self.count('X')) + ' / ' + str(step_time['X']) + ' / ' + str(total_time['X']))
+            print("白   棋: " + str(self.count('O')) + ' / ' + str(step_time['O']) + ' / ' + str(total_time['O']) + '\n')
+
+    def count(self, color):
+        """
+        统计 color 一方棋子的数量。(O:白棋, X:黑棋, .:未落子状态)
+        """
+        if color == 'X':
+            return self.black_count
+        if color == 'O':
+            return self.white_count
+        if color == self.empty:
+            return 64 - self.black_count - self.white_count
+        return 0
+
+    def pieces_index(self):
+        """
+        更新棋盘上的棋子统计数据。
+        将黑棋和白棋的数量分别保存到属性 black_count 和 white_count 中。
+        落子与撤销时计数会增量维护，此方法仅用于重新同步。
+        """
+        self.black_count = popcount(self._bits['X'])
+        self.white_count = popcount(self._bits['O'])
+
+    def _legal_bits(self, color):
+        """
+        获取 color 一方合法落子的位棋盘（带缓存）
+        """
+        moves = self._legal.get(color)
+        if moves is None:
+            moves = get_moves(self._bits[color], self._bits[OPPONENT[color]], self._frontier)
+            self._legal[color] = moves
+        return moves
+
+    def hash_key(self, color=None):
+        """
+        返回局面的 Zobrist 键
+        :param color: 轮到落子的一方，传入时将行棋方一并编入键中
+        """
+        if color == 'O':
+            return self._hash ^ ZOBRIST_SIDE
+        return self._hash
+
+    def current_state(self, color=None):
+        """
+        返回神经网络输入的 2x8x8 特征平面：第 0 层为行棋方棋子，第 1 层为对手棋子
+        :param color: 行棋方，默认为 self.color（由 AIplayer3 设置）
+        特征由位棋盘直接展开，同一局面重复调用时直接返回缓存结果
+        """
+        color = color or getattr(self, 'color', 'X')
+        key = (self._hash, color)
+        cached = getattr(self, '_state', None)
+        if cached is None or cached[0] != key:
+            # 只有神经网络玩家需要 numpy，按需导入以免拖慢其他玩家的启动
+            from features import encode_board
+            cached = self._state = (key, encode_board(self, color))
+        return cached[1]
+
+    def is_game_over(self):
+        """
+        判断游戏是否结束：棋盘已满或双方均无合法走法
+        """
+        if self.black_count + self.white_count == 64:
+            return True
+        return not (self._legal_bits('X') or self._legal_bits('O'))
+
+    def get_winner(self):
+        """
+        通过棋子的个数判断胜负
+        :return: 0-黑棋赢, 1-白棋赢, 2-平局, 同时返回胜负分差
+        """
+        black_count, white_count = self.black_count, self.white_count
+        if black_count > white_count:
+            return 0, black_count - white_count
+        elif black_count < white_count:
+            return 1, white_count - black_count
+        else:
+            return 2, 0
+
+    def _to_bit(self, action):
+        """
+        将落子坐标（'A1' 或 (0, 0)）转换为位棋盘中的单个位，坐标不合法时返回 0
+        """
+        if isinstance(action, str):
+            action = self.board_num(action)
+        if action is None:
+            return 0
+        x, y = action
+        if not self.is_on_board(x, y):
+            return 0
+        return 1 << (x * 8 + y)
+
+    def _make(self, move, color):
+        """
+        位棋盘落子，返回翻转棋子的位棋盘，不合法时返回 0
+        """
+        op_color = OPPONENT[color]
+        own, opp = self._bits[color], self._bits[op_color]
+        if not move or (own | opp) & move:
+            return 0
+        flips = get_flips(move, own, opp)
+        if not flips:
+            return 0
+        self._history.append((move, flips, color, self._frontier, self._legal))
+        self._bits[color] = own | flips | move
+        self._bits[op_color] = opp ^ flips
+        self._frontier = (self._frontier | neighbours(move)) & ~(own | opp | move)
+        self._legal = {}
+        self._hash ^= ZOBRIST_KEYS[color][move.bit_length() - 1] ^ zobrist(flips, ZOBRIST_TABLES['flip'])
+        # 增量更新棋子计数信息
+        n = popcount(flips)
+        if color == 'X':
+            self.black_count += n + 1
+            self.white_count -= n
+        else:
+            self.white_count += n + 1
+            self.black_count -= n
+        return flips
+
+    def _unmake(self, move, flips, color):
+        """
+        撤销位棋盘落子。若与最近一次落子一致，则直接从历史中恢复边界空位与合法落子缓存
+        """
+        op_color = OPPONENT[color]
+        self._bits[color] &= ~(flips | move)
+        self._bits[op_color] |= flips
+        history = self._history
+        if history and history[-1][0] == move and history[-1][2] == color:
+            _, _, _, self._frontier, self._legal = history.pop()
+        else:
+            self._frontier = neighbours(self._bits['X'] | self._bits['O'])
+            self._legal = {}
+        self._hash ^= ZOBRIST_KEYS[color][move.bit_length() - 1] ^ zobrist(flips, ZOBRIST_TABLES['flip'])
+        n = popcount(flips)
+        if color == 'X':
+            self.black_count -= n + 1
+            self.white_count += n
+        else:
+            self.white_count -= n + 1
+            self.black_count += n
+
+    def _move(self, action, color):
+        """
+        落子并返回翻转棋子的坐标列表
+        """
+        flips = self._make(self._to_bit(action), color)
+        if not flips:
+            return False
+        return [SQUARE_NAMES[sq] for sq in iter_bits(flips)]
+
+    def backpropagation(self, action, flipped_pos, color):
+        """
+        回溯操作，撤销落子
+        """
+        move = self._to_bit(action)
+        history = self._history
+        if history and history[-1][0] == move and history[-1][2] == color:
+            flips = history[-1][1]
+        else:
+            flips = 0
+            for p in flipped_pos:
+                flips |= self._to_bit(p)
+        self._unmake(move, flips, color)
+
+    def is_on_board(self, x, y):
+        """
+        判断坐标是否在棋盘范围内
+        """
+        return 0 <= x < 8 and 0 <= y < 8
+
+    def _can_fliped(self, action, color):
+        """
+        判断落子是否合法，返回翻转子坐标列表或 False
+        """
+        move = self._to_bit(action)
+        if not move & self._legal_bits(color):
+            return False
+        flips = get_flips(move, self._bits[color], self._bits[OPPONENT[color]])
+        return [SQUARE_NAMES[sq] for sq in iter_bits(flips)]
+
+    def get_legal_actions(self, color):
+        """
+        根据棋规获取合法落子坐标
+        """
+        for sq in iter_bits(self._legal_bits(color)):
+            yield SQUARE_NAMES[sq]
+
+    def board_num(self, action):
+        """
+        棋盘坐标转数字坐标，例如 A1 --> (0,0)
+        """
+        row, col = str(action[1]).upper(), str(action[0]).upper()
+        if row in '12345678' and col in 'ABCDEFGH':
+            x, y = '12345678'.index(row), 'ABCDEFGH'.index(col)
+            return x, y
+
+    def num_board(self, action):
+        """
+        数字坐标转棋盘坐标，例如 (0,0) --> A1
+        """
+        row, col = action
+        if col in range(8) and row in range(8):
+            return chr(ord('A') + col) + str(row + 1)
@@ -0,0 +1,119 @@
+import os
+from time import perf_counter
+
+'''
+搜索预算。
+搜索循环在每次迭代结束时调用 step() 协作式地检查预算（墙钟时间、迭代次数、节点数、内存），
+预算用完时在两次迭代之间正常退出，不会像 func_timeout 那样从另一个线程中途打断搜索、留下不完整的树。
+allocate_time 按对局阶段分配每步的思考时间，并保证不超过每步 60 秒的限制。
+'''
+
+# Game 规定的每步时间上限（秒）
+MOVE_TIME_LIMIT = 60
+# 为落子返回、打印等留出的余量（秒）
+SAFETY_MARGIN = 2
+
+# (剩余空格数下限, 时间系数)：开局走法差别不大，中局最关键，残局分支少
+PHASE_FACTORS = ((49, 0.5), (21, 1.4), (0, 0.8))
+
+
+def _memory_mb():
+    """
+    当前进程的常驻内存（MB），无法获取时返回 None
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def allocate_time(board, base_time, move_limit=MOVE_TIME_LIMIT):
+    """
+    按对局阶段分配本步的思考时间
+    :param base_time: 平均每步时间（秒）
+    :return: 本步的时间（秒），不超过 move_limit - SAFETY_MARGIN
+    """
+    empties = 64 - board.count('X') - board.count('O')
+    factor = next(f for threshold, f in PHASE_FACTORS if empties >= threshold)
+    return max(min(base_time * factor, move_limit - SAFETY_MARGIN), 0)
+
+
+class SearchBudget(object):
+    '''
+    一次搜索的预算，各项限制为 None 时表示不限制
+    '''
+    # 每隔多少次迭代检查一次内存
+    MEMORY_CHECK_INTERVAL = 1024
+
+    def __init__(self, time_limit=None, iterations=None, nodes=None, memory_mb=None):
+        """
+        :param time_limit: 墙钟时间（秒）
+        :param iterations: 迭代（模拟）次数
+        :param nodes: 搜索树的节点数
+        :param memory_mb: 进程内存上限（MB）
+        """
+        self.time_limit = time_limit
+        self.iterations = iterations
+        self.nodes = nodes
+        self.memory_mb = memory_mb
+        self.start()
+
+    @classmethod
+    def for_move(cls, board, base_time, adaptive=False, **limits):
+        """
+        为一步棋创建时间预算
+        :param adaptive: 是否按对局阶段调整时间（见 allocate_time）
+        """
+        time_limit = allocate_time(board, base_time) if adaptive else min(base_time, MOVE_TIME_LIMIT - SAFETY_MARGIN)
+        return cls(time_limit=time_limit, **limits)
+
+    def start(self):
+        """
+        重新开始计时与计数
+        """
+        self.start_time = perf_counter()
+        self.deadline = None if self.time_limit is None else self.start_time + self.time_limit
+        self.iterations_done = 0
+        self.nodes_used = 0
+        self.out_of_memory = False
+        return self
+
+    def elapsed(self):
+        return perf_counter() - self.start_time
+
+    def remaining_time(self):
+        if self.deadline is None:
+            return float('inf')
+        return max(self.deadline - perf_counter(), 0)
+
+    def exhausted(self):
+        """
+        预算是否已用完
+        """
+        if self.iterations is not None and self.iterations_done >= self.iterations:
+            return True
+        if self.nodes is not None and self.nodes_used >= self.nodes:
+            return True
+        if self.deadline is not None and perf_counter() >= self.deadline:
+            return True
+        return self.out_of_memory
+
+    def step(self, nodes=None):
+        """
+        记录完成一次迭代
+        :param nodes: 当前搜索树的节点总数，为空时不更新
+        :return: 预算是否还有剩余
+        """
+        self.iterations_done += 1
+        if nodes is not None:
+            self.nodes_used = nodes
+        if self.memory_mb is not None and self.iterations_done % self.MEMORY_CHECK_INTERVAL == 0:
+            memory = _memory_mb()
+            self.out_of_memory = memory is not None and memory >= self.memory_mb
+        return not self.exhausted()
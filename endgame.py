@@ -0,0 +1,186 @@
+from board import SQUARE_NAMES, SQUARE_TIER, get_flips, get_moves, iter_bits, popcount
+from budget import SearchBudget
+
+'''
+残局精确求解。
+在位棋盘上做负极大值（negamax）alpha-beta 搜索直到终局，得分为终局时行棋方与对手的棋子数之差（与 Board.get_winner 一致）。
+走法排序：空格较多时优先走对手行动力最小的走法（fastest-first），空格较少时按奇偶性优先走空格数为奇数的象限，
+同一局面在置换表中记录的最佳走法总是最先尝试。
+搜索按节点数与时间协作式地检查预算（见 budget.SearchBudget），用完时放弃求解，由调用方退回蒙特卡洛树搜索。
+
+使用方法：
+    solver = EndgameSolver()
+    if empties(board) <= DEFAULT_EMPTIES:
+        move = solver.best_move(board, 'X', endgame_budget(time_limit))
+'''
+
+# 玩家切换到精确求解的默认空格数：单核 6~10 万节点/秒（随机器负载变化），12 空平均 0.3~0.65 秒可解出（见 benchmark.py endgame）
+DEFAULT_EMPTIES = 12
+# 求解最多使用本步时间的比例，其余时间留给求解失败后退回的搜索
+TIME_SHARE = 0.5
+# 没有时间限制（按模拟次数搜索）的玩家使用的求解时间（秒）
+DEFAULT_TIME_LIMIT = 2
+
+# 四个象限的掩码，用于奇偶性排序
+QUADRANTS = (0x000000000F0F0F0F, 0x00000000F0F0F0F0, 0x0F0F0F0F00000000, 0xF0F0F0F000000000)
+
+# 局面不可能达到的分数，作为窗口边界
+SCORE_INF = 65
+
+
+def empties(board):
+    """
+    棋盘上的空格数
+    """
+    return 64 - board.count('X') - board.count('O')
+
+
+def endgame_budget(time_limit=None, max_nodes=None):
+    """
+    玩家一步中用于残局求解的预算
+    :param time_limit: 本步的时间（秒），为空时使用 DEFAULT_TIME_LIMIT
+    :param max_nodes: 节点数上限
+    """
+    return SearchBudget(time_limit=DEFAULT_TIME_LIMIT if time_limit is None else time_limit * TIME_SHARE,
+                        nodes=max_nodes)
+
+
+class BudgetExceeded(Exception):
+    '''
+    求解过程中预算用完
+    '''
+
+
+class EndgameSolver(object):
+    '''
+    残局求解器，置换表在多次求解之间保留
+    '''
+    # 空格数不少于此值时按对手行动力排序，否则按奇偶性排序
+    MOBILITY_ORDER_EMPTIES = 7
+    # 空格数不少于此值的局面才写入置换表
+    TABLE_MIN_EMPTIES = 5
+    # 每隔多少个节点检查一次预算
+    CHECK_INTERVAL = 1024
+
+    def __init__(self, table_size=100000):
+        """
+        :param table_size: 置换表容量，超出时在下一次求解前清空。每项约 300 字节，默认约 30 MB；
+                           一次 12 空求解新增约 2 千项、14 空约 1.5 万项，足够在一局的残局各步之间复用
+        """
+        self.table_size = table_size
+        self.table = {}
+        self.nodes = 0
+        self.budget = None
+
+    def solve(self, board, color, budget=None):
+        """
+        精确求解
+        :param color: 行棋方
+        :param budget: 搜索预算（SearchBudget），为空时不限制
+        :return: (行棋方的终局分差, 最佳落子)，无子可下时落子为 None；预算用完时返回 None
+        """
+        op_color = 'O' if color == 'X' else 'X'
+        own, opp = board._bits[color], board._bits[op_color]
+        self.nodes = 0
+        self.budget = budget
+        if len(self.table) > self.table_size:
+            self.table.clear()
+        try:
+            score, move = self._root(own, opp)
+        except BudgetExceeded:
+            return None
+        finally:
+            self.budget = None
+        return score, None if move is None else SQUARE_NAMES[move.bit_length() - 1]
+
+    def best_move(self, board, color, budget=None):
+        """
+        求解并返回最佳落子，无子可下或预算用完时返回 None
+        """
+        result = self.solve(board, color, budget)
+        return None if result is None else result[1]
+
+    def _root(self, own, opp):
+        # 根节点：与内部节点相同的搜索，同时记录最佳走法
+        moves = get_moves(own, opp)
+        if not moves:
+            return self._search(own, opp, -SCORE_INF, SCORE_INF, False), None
+        alpha, best_move = -SCORE_INF, None
+        for move, flips in self._ordered(own, opp, moves):
+            score = -self._search(opp ^ flips, own | flips | move, -SCORE_INF, -alpha, False)
+            if score > alpha:
+                alpha, best_move = score, move
+        return alpha, best_move
+
+    def _ordered(self, own, opp, moves, hint=0):
+        # 返回排好序的 (落子位, 翻转位) 列表
+        empty = ~(own | opp) & 0xFFFFFFFFFFFFFFFF
+        candidates = []
+        if popcount(empty) >= self.MOBILITY_ORDER_EMPTIES:
+            for sq in iter_bits(moves):
+                move = 1 << sq
+                flips = get_flips(move, own, opp)
+                # 对手行动力越小越好，同等时角、边等优先级高的位置优先
+                mobility = popcount(get_moves(opp ^ flips, own | flips | move))
+                candidates.append((move != hint, mobility, SQUARE_TIER[sq], move, flips))
+        else:
+            odd = 0
+            for quadrant in QUADRANTS:
+                if popcount(empty & quadrant) & 1:
+                    odd |= quadrant
+            for sq in iter_bits(moves):
+                move = 1 << sq
+                candidates.append((move != hint, not move & odd, SQUARE_TIER[sq], move,
+                                   get_flips(move, own, opp)))
+        candidates.sort()
+        return [(c[3], c[4]) for c in candidates]
+
+    def _search(self, own, opp, alpha, beta, passed):
+        # 负极大值 alpha-beta 搜索，返回行棋方的终局分差
+        self.nodes += 1
+        if self.budget is not None and self.nodes % self.CHECK_INTERVAL == 0 and not self.budget.step(self.nodes):
+            raise BudgetExceeded()
+        moves = get_moves(own, opp)
+        if not moves:
+            if passed:
+                return popcount(own) - popcount(opp)
+            return -self._search(opp, own, -beta, -alpha, True)
+
+        n_empty = 64 - popcount(own | opp)
+        if n_empty == 1:
+            # 最后一个空格：直接落子，终局
+            flips = get_flips(moves, own, opp)
+            return popcount(own | flips) + 1 - popcount(opp ^ flips)
+
+        key = (own, opp)
+        hint = 0
+        use_table = n_empty >= self.TABLE_MIN_EMPTIES
+        if use_table:
+            entry = self.table.get(key)
+            if entry is not None:
+                lower, upper, hint = entry
+                if lower >= beta:
+                    return lower
+                if upper <= alpha:
+                    return upper
+                alpha, beta = max(alpha, lower), min(beta, upper)
+
+        alpha_orig = alpha
+        best, best_move = -SCORE_INF, 0
+        for move, flips in self._ordered(own, opp, moves, hint):
+            score = -self._search(opp ^ flips, own | flips | move, -beta, -alpha, False)
+            if score > best:
+                best, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if use_table:
+            if best <= alpha_orig:
+                self.table[key] = (-SCORE_INF, best, best_move)
+            elif best >= beta:
+                self.table[key] = (best, SCORE_INF, best_move)
+            else:
+                self.table[key] = (best, best, best_move)
+        return best
@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from symmetry import canonical, transform_array, inverse_transform_array
+
+'''
+策略价值网络的评估缓存。
+以行棋方视角的 (己方位棋盘, 对方位棋盘) 在 8 种对称变换下的最小者为键，
+对称的局面共用一条缓存；落子概率以代表局面的朝向保存，命中时再变换回原朝向。
+缓存容量有上限，按最近最少使用（LRU）淘汰；网络权重变化（weights_version 改变）时整体失效。
+可供多个搜索线程同时调用（例如多线程的 AIPlayerplus），网络评估在锁外进行。
+'''
+
+
+class EvalCache(object):
+    '''
+    位于 policy_value_fn 之前的 LRU 评估缓存
+    '''
+    def __init__(self, policy_value_net, capacity=100000):
+        """
+        :param policy_value_net: PolicyValueNet（或提供 policy_value_fn / policy_value_fn_batch 的对象）
+        :param capacity: 最多缓存的局面数
+        """
+        self.net = policy_value_net
+        self.capacity = capacity
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # 第一次评估时才读取权重版本，延迟加载的网络（players.LazyPolicyValueNet）不会在创建缓存时加载
+        self.version = None
+        self.lock = threading.Lock()
+
+    def _check_version(self):
+        """
+        网络权重更新后清空缓存
+        """
+        version = getattr(self.net, 'weights_version', 0)
+        with self.lock:
+            if version != self.version:
+                self.table.clear()
+                self.version = version
+
+    def _key(self, board):
+        """
+        返回 (代表局面, 变换编号)
+        """
+        color = getattr(board, 'color', 'X')
+        return canonical(board._bits[color], board._bits['O' if color == 'X' else 'X'])
+
+    def _get(self, key, k):
+        with self.lock:
+            entry = self.table.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.table.move_to_end(key)
+        act_probs, value = entry
+        return np.ascontiguousarray(inverse_transform_array(act_probs, k)), value
+
+    def _put(self, key, k, act_probs, value):
+        entry = (np.ascontiguousarray(transform_array(act_probs, k), dtype=np.float32), value)
+        with self.lock:
+            self.table[key] = entry
+            if len(self.table) > self.capacity:
+                self.table.popitem(last=False)
+
+    def policy_value_fn(self, board):
+        """
+        与 PolicyValueNet.policy_value_fn 接口一致
+        """
+        self._check_version()
+        key, k = self._key(board)
+        result = self._get(key, k)
+        if result is None:
+            result = self.net.policy_value_fn(board)
+            self._put(key, k, *result)
+        return result
+
+    def policy_value_fn_batch(self, boards):
+        """
+        与 PolicyValueNet.policy_value_fn_batch 接口一致，未命中的局面合并为一批评估
+        """
+        self._check_version()
+        keys = [self._key(board) for board in boards]
+        results = [self._get(key, k) for key, k in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            evaluated = self.net.policy_value_fn_batch([boards[i] for i in missing])
+            for i, result in zip(missing, evaluated):
+                results[i] = result
+                self._put(keys[i][0], keys[i][1], *result)
+        return results
+
+    def clear(self):
+        with self.lock:
+            self.table.clear()
+
+    def stats(self):
+        """
+        返回命中/未命中次数、命中率与当前缓存条数
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0, 'size': len(self.table)}
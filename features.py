@@ -0,0 +1,52 @@
+import numpy as np
+
+'''
+神经网络输入特征编码。
+Net 的输入为 2x8x8 的特征平面：第 0 层为行棋方的棋子，第 1 层为对手的棋子。
+特征直接由棋盘增量维护的位棋盘展开得到（np.unpackbits），不经过 Python 列表；
+批量编码把成千上万个局面一次写入预先分配的数组，用于推理与训练。
+'''
+
+
+def encode_bits(own, opp, out=None):
+    """
+    批量把位棋盘编码为特征平面
+    :param own: 行棋方位棋盘数组，形状 (N,)
+    :param opp: 对手位棋盘数组，形状 (N,)
+    :param out: 预先分配的 (N, 2, 8, 8) 数组（任意数值类型），为空时新建 float32 数组
+    :return: out
+    """
+    bits = np.empty((len(own), 2), dtype='<u8')
+    bits[:, 0] = own
+    bits[:, 1] = opp
+    planes = np.unpackbits(bits.view(np.uint8), axis=1, bitorder='little').reshape(-1, 2, 8, 8)
+    if out is None:
+        return planes.astype(np.float32)
+    out[...] = planes
+    return out
+
+
+def encode_board(board, color=None):
+    """
+    从 color 一方（默认为 board.color）的视角编码单个棋盘
+    :return: (2, 8, 8) float32 数组
+    """
+    color = color or getattr(board, 'color', 'X')
+    op_color = 'O' if color == 'X' else 'X'
+    return encode_bits([board._bits[color]], [board._bits[op_color]])[0]
+
+
+def encode_batch(boards, colors=None, out=None):
+    """
+    批量编码棋盘
+    :param boards: 棋盘列表
+    :param colors: 各棋盘的行棋方，默认取各棋盘的 color 属性
+    :param out: 预先分配的 (N, 2, 8, 8) 数组
+    :return: out
+    """
+    if colors is None:
+        colors = [getattr(board, 'color', 'X') for board in boards]
+    own = np.fromiter((b._bits[c] for b, c in zip(boards, colors)), dtype=np.uint64, count=len(boards))
+    opp = np.fromiter((b._bits['O' if c == 'X' else 'X'] for b, c in zip(boards, colors)),
+                      dtype=np.uint64, count=len(boards))
+    return encode_bits(own, opp, out)
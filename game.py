@@ -1,7 +1,6 @@
 # !/usr/bin/Anaconda3/python
 # -*- coding: utf-8 -*-
 
-from func_timeout import func_timeout, FunctionTimedOut
 import datetime
 from board import Board
 from copy import deepcopy
@@ -112,30 +111,25 @@ class Game(object):
             board = deepcopy(self.board._board)
 
             # legal_actions 不等于 0 则表示当前下棋方有合法落子位置
-            try:
-                for i in range(0, 3):
-                    # 获取落子位置
-                    action = func_timeout(60, self.current_player.get_move,
-                                          kwargs={'board': self.board})
-
-                    # 如果 action 是 Q 则说明人类想结束比赛
-                    if action == "Q":
-                        # 说明人类想结束游戏，即根据棋子个数定输赢。
-                        break
-                    if action not in legal_actions:
-                        # 判断当前下棋方落子是否符合合法落子,如果不合法,则需要对方重新输入
-                        print("你落子不符合规则,请重新落子！")
-                        continue
-                    else:
-                        # 落子合法则直接 break
-                        break
+            for i in range(0, 3):
+                # 获取落子位置
+                # 玩家在自己的搜索预算内协作式地结束思考，超时由落子后的计时判定
+                action = self.current_player.get_move(board=self.board)
+
+                # 如果 action 是 Q 则说明人类想结束比赛
+                if action == "Q":
+                    # 说明人类想结束游戏，即根据棋子个数定输赢。
+                    break
+                if action not in legal_actions:
+                    # 判断当前下棋方落子是否符合合法落子,如果不合法,则需要对方重新输入
+                    print("你落子不符合规则,请重新落子！")
+                    continue
                 else:
-                    # 落子3次不合法，结束游戏！
-                    winner, diff = self.force_loss(is_legal=True)
+                    # 落子合法则直接 break
                     break
-            except FunctionTimedOut:
-                # 落子超时，结束游戏
-                winner, diff = self.force_loss(is_timeout=True)
+            else:
+                # 落子3次不合法，结束游戏！
+                winner, diff = self.force_loss(is_legal=True)
                 break
 
             # 结束时间
@@ -197,12 +191,8 @@ class Game(object):
 
         # 根据当前棋盘，判断棋局是否终止
         # 如果当前选手没有合法下棋的位子，则切换选手；如果另外一个选手也没有合法的下棋位置，则比赛停止。
-        b_list = list(self.board.get_legal_actions('X'))
-        w_list = list(self.board.get_legal_actions('O'))
-
-        is_over = len(b_list) == 0 and len(w_list) == 0  # 返回值 True/False
-
-        return is_over
+        # 棋盘内部缓存了双方的合法落子，无需重复生成
+        return self.board.is_game_over()
 
 #
 #
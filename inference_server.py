@@ -0,0 +1,340 @@
+import queue
+import pickle
+import threading
+import multiprocessing as mp
+from collections import Counter
+from concurrent.futures import Future
+from time import perf_counter
+import numpy as np
+import torch
+from policy_value_net import PolicyValueNet
+
+'''
+策略价值网络的批量推理服务。
+调用方提交棋盘（或 2x8x8 特征平面）并立即得到 Future；服务端把同一时间段内的请求
+合并为动态批次（不超过 max_batch_size，首个请求最多等待 max_wait_ms 毫秒），
+每批只做一次 Net.forward，再把 (落子概率 8x8, 局面评估) 分发回各个 Future。
+这样多局同时进行的 AIPlayerplus 可以共用一份模型。
+
+运行方式（mode）：
+  'inline'  : 在调用线程中立即评估（批大小恒为 1），便于调试
+  'thread'  : 在当前进程的后台线程中批量评估
+  'process' : 在独立进程中加载模型并批量评估，主进程通过队列收发请求
+'''
+
+
+def _forward(net, states, use_gpu=False):
+    """
+    对一批特征平面做一次前向传播
+    :param states: (N, 2, 8, 8) 数组
+    :return: (N, 8, 8) 落子概率, (N,) 局面评估
+    """
+    with torch.inference_mode():
+        state_batch = torch.from_numpy(np.ascontiguousarray(states, dtype=np.float32))
+        if use_gpu:
+            state_batch = state_batch.cuda()
+        log_act_probs, value = net(state_batch)
+        act_probs = np.exp(log_act_probs.cpu().numpy()).reshape(-1, 8, 8)
+        return act_probs, value.cpu().numpy().reshape(-1)
+
+
+def _collect_batch(get, max_batch_size, max_wait):
+    """
+    从请求队列中凑出一批：阻塞等待第一个请求，之后在 max_wait 秒内尽量凑满 max_batch_size
+    :return: 请求列表；收到结束标记 None 时返回 None
+    """
+    first = get()
+    if first is None:
+        return None
+    batch = [first]
+    deadline = perf_counter() + max_wait
+    while len(batch) < max_batch_size:
+        timeout = deadline - perf_counter()
+        if timeout <= 0:
+            break
+        try:
+            item = get(timeout=timeout)
+        except queue.Empty:
+            break
+        if item is None:
+            # 把结束标记留给下一轮
+            batch.append(None)
+            break
+        batch.append(item)
+    return batch
+
+
+def _picklable(exc):
+    """
+    返回可以经队列传回主进程的异常，无法序列化时以 RuntimeError 代替
+    """
+    try:
+        pickle.dumps(exc)
+        return exc
+    except Exception:
+        return RuntimeError('{}: {}'.format(type(exc).__name__, exc))
+
+
+def _serve_process(model_file, state_dict, request_queue, result_queue, max_batch_size, max_wait, use_gpu,
+                   optimize=False):
+    """
+    独立进程中的推理循环：请求为 (请求编号, 特征平面)，结果为 (编号列表, 异常, 概率, 评估)，
+    推理出错时异常不为空，该批的请求都以此异常结束
+    """
+    load_error = None
+    try:
+        policy_value_net = PolicyValueNet(model_file=model_file, use_gpu=use_gpu)
+        if state_dict is not None:
+            policy_value_net.policy_value_net.load_state_dict(state_dict)
+            policy_value_net.weights_version += 1
+        policy_value_net.policy_value_net.eval()
+        policy_value_net.optimize = optimize
+        if optimize:
+            policy_value_net.warmup()
+    except Exception as exc:
+        # 模型加载失败时继续接收请求，全部以加载时的异常结束，避免主进程等待
+        load_error = _picklable(exc)
+    stop = False
+    while not stop:
+        batch = _collect_batch(request_queue.get, max_batch_size, max_wait)
+        if batch is None:
+            break
+        if batch[-1] is None:
+            batch.pop()
+            stop = True
+        if not batch:
+            break
+        ids = [req_id for req_id, _ in batch]
+        if load_error is not None:
+            result_queue.put((ids, load_error, None, None))
+            continue
+        try:
+            act_probs, values = _forward(policy_value_net.inference_net(len(batch)),
+                                         np.stack([state for _, state in batch]), use_gpu)
+        except Exception as exc:
+            result_queue.put((ids, _picklable(exc), None, None))
+            continue
+        result_queue.put((ids, None, act_probs, values))
+    result_queue.put(None)
+
+
+class InferenceServer(object):
+    '''
+    批量推理服务
+    '''
+    # 延迟直方图的分桶上界（毫秒）
+    LATENCY_BUCKETS = (0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256, float('inf'))
+    # 进程模式下结果分发线程检查子进程是否存活的间隔（秒）
+    DEAD_CHECK_INTERVAL = 1.0
+
+    def __init__(self, policy_value_net=None, model_file=None, max_batch_size=32, max_wait_ms=2.0,
+                 mode='thread', use_gpu=False, optimize=False):
+        """
+        :param policy_value_net: 已加载的 PolicyValueNet，为空时从 model_file 加载
+        :param max_batch_size: 单批最大请求数
+        :param max_wait_ms: 凑批时最多等待的毫秒数
+        :param mode: 'inline' / 'thread' / 'process'
+        :param optimize: 从 model_file 加载时是否使用 TorchScript 优化的推理模块（见 PolicyValueNet）
+        """
+        if mode not in ('inline', 'thread', 'process'):
+            raise ValueError('unknown mode: {}'.format(mode))
+        self.mode = mode
+        self.model_file = model_file
+        self.use_gpu = use_gpu
+        self.optimize = optimize or getattr(policy_value_net, 'optimize', False)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        if mode != 'process' or policy_value_net is not None:
+            self.policy_value_net = policy_value_net or PolicyValueNet(model_file=model_file, use_gpu=use_gpu,
+                                                                         optimize=optimize)
+        else:
+            self.policy_value_net = None
+        self.batch_sizes = Counter()
+        self.latencies = Counter()
+        self.lock = threading.Lock()
+        self.requests = None
+        self.worker = None
+
+    def start(self):
+        """
+        启动后台线程或进程，可重复调用
+        """
+        if self.worker is not None or self.mode == 'inline':
+            return self
+        if self.mode == 'thread':
+            self.requests = queue.Queue()
+            self.worker = threading.Thread(target=self._serve_thread, daemon=True)
+            self.worker.start()
+        else:
+            ctx = mp.get_context('spawn')
+            self.requests = ctx.Queue()
+            self.results = ctx.Queue()
+            self.futures = {}
+            self.next_id = 0
+            state_dict = None
+            if self.policy_value_net is not None:
+                state_dict = {k: v.cpu() for k, v in self.policy_value_net.get_policy_param().items()}
+            self.process = ctx.Process(target=_serve_process, daemon=True,
+                                       args=(self.model_file, state_dict, self.requests, self.results,
+                                             self.max_batch_size, self.max_wait, self.use_gpu, self.optimize))
+            self.process.start()
+            self.worker = threading.Thread(target=self._dispatch_results, daemon=True)
+            self.worker.start()
+        return self
+
+    def stop(self):
+        """
+        停止服务，已提交的请求会先处理完
+        """
+        if self.worker is None:
+            return
+        self.requests.put(None)
+        self.worker.join()
+        if self.mode == 'process':
+            self.process.join()
+        self.worker = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def submit(self, state):
+        """
+        提交一个 2x8x8 特征平面，返回 Future，结果为 (落子概率 8x8, 局面评估)
+        """
+        future = Future()
+        submitted = perf_counter()
+        if self.mode == 'inline':
+            try:
+                act_probs, values = _forward(self.policy_value_net.inference_net(), state[None], self.use_gpu)
+            except Exception as exc:
+                future.set_exception(exc)
+                return future
+            self._record(1, [submitted])
+            future.set_result((act_probs[0], values[0]))
+            return future
+        self.start()
+        if self.mode == 'process' and not self.process.is_alive():
+            future.set_exception(RuntimeError('inference process has exited'))
+            return future
+        if self.mode == 'thread':
+            self.requests.put((state, future, submitted))
+        else:
+            with self.lock:
+                req_id = self.next_id
+                self.next_id += 1
+                self.futures[req_id] = (future, submitted)
+            self.requests.put((req_id, np.ascontiguousarray(state, dtype=np.float32)))
+        return future
+
+    def submit_board(self, board):
+        """
+        提交棋盘（行棋方为 board.color），返回 Future
+        """
+        return self.submit(board.current_state())
+
+    def policy_value_fn(self, board):
+        """
+        与 PolicyValueNet.policy_value_fn 接口一致的阻塞调用，可直接传给 AIPlayerplus
+        """
+        return self.submit_board(board).result()
+
+    def policy_value_fn_batch(self, boards):
+        """
+        与 PolicyValueNet.policy_value_fn_batch 接口一致的阻塞调用
+        """
+        futures = [self.submit_board(board) for board in boards]
+        return [future.result() for future in futures]
+
+    def _serve_thread(self):
+        """
+        线程模式的推理循环
+        """
+        while True:
+            batch = _collect_batch(self.requests.get, self.max_batch_size, self.max_wait)
+            if batch is None:
+                return
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            if batch:
+                try:
+                    act_probs, values = _forward(self.policy_value_net.inference_net(len(batch)),
+                                                 np.stack([state for state, _, _ in batch]), self.use_gpu)
+                except Exception as exc:
+                    # 一批出错只让这一批的请求失败，服务继续运行
+                    for _, future, _ in batch:
+                        future.set_exception(exc)
+                else:
+                    self._record(len(batch), [submitted for _, _, submitted in batch])
+                    for i, (_, future, _) in enumerate(batch):
+                        future.set_result((act_probs[i], values[i]))
+            if stop:
+                return
+
+    def _dispatch_results(self):
+        """
+        进程模式下在主进程中把推理结果分发给对应的 Future
+        """
+        while True:
+            try:
+                item = self.results.get(timeout=self.DEAD_CHECK_INTERVAL)
+            except queue.Empty:
+                if self.process.is_alive():
+                    continue
+                # 子进程意外退出：未完成的请求全部以异常结束
+                self._fail_pending(RuntimeError('inference process exited with code {}'.format(
+                    self.process.exitcode)))
+                return
+            if item is None:
+                self._fail_pending(RuntimeError('inference server stopped'))
+                return
+            ids, error, act_probs, values = item
+            with self.lock:
+                entries = [self.futures.pop(req_id) for req_id in ids]
+            if error is not None:
+                for future, _ in entries:
+                    future.set_exception(error)
+                continue
+            self._record(len(ids), [submitted for _, submitted in entries])
+            for i, (future, _) in enumerate(entries):
+                future.set_result((act_probs[i], values[i]))
+
+    def _fail_pending(self, exc):
+        """
+        进程模式下让所有尚未返回结果的请求以异常结束
+        """
+        with self.lock:
+            entries = list(self.futures.values())
+            self.futures.clear()
+        for future, _ in entries:
+            future.set_exception(exc)
+
+    def _record(self, batch_size, submitted_times):
+        """
+        记录批大小与每个请求的延迟
+        """
+        now = perf_counter()
+        with self.lock:
+            self.batch_sizes[batch_size] += 1
+            for submitted in submitted_times:
+                latency = (now - submitted) * 1000
+                bucket = next(b for b in self.LATENCY_BUCKETS if latency <= b)
+                self.latencies[bucket] += 1
+
+    def stats(self):
+        """
+        返回批大小直方图、延迟直方图（毫秒分桶上界 --> 请求数）及汇总数据
+        """
+        with self.lock:
+            batches = sum(self.batch_sizes.values())
+            requests = sum(size * n for size, n in self.batch_sizes.items())
+            return {
+                'batches': batches,
+                'requests': requests,
+                'mean_batch_size': requests / batches if batches else 0,
+                'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+                'latency_ms_histogram': dict(sorted(self.latencies.items())),
+            }
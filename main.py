@@ -1,20 +1,67 @@
-from AIplayer2 import AIPlayer as AIPlayer2
-from AIplayer1 import AIPlayer as AIPlayer1
-from policy_value_net import PolicyValueNet
-from AIplayer3 import AIPlayerplus    
+import argparse
+from players import PLAYERS, PLAYER_DEFAULTS, create_player, create_pondering_player
 # 导入黑白棋文件
 from game import Game
 
-# 人类玩家黑棋初始化
-black_player =  AIPlayer2("X")
+'''
+对局入口，使用方法：
+    python main.py --black roxanne-mcts --white mcts
+    python main.py --black alphabeta --white mcts --time 1
+    python main.py --black net --white mcts --model best_policy.model --mcts-n 1000
+    python main.py --list
+'''
 
-# AI 玩家 白棋初始化
-white_player = AIPlayer1("O")
 
-policy_value_net = PolicyValueNet(model_file='D:\文件\CS\AI\Ex2\\best_policy.model')
+def main():
+    parser = argparse.ArgumentParser(description='黑白棋对局')
+    parser.add_argument('--black', default='roxanne-mcts', help='黑棋玩家')
+    parser.add_argument('--white', default='mcts', help='白棋玩家')
+    parser.add_argument('--list', action='store_true', help='列出可用的玩家')
+    parser.add_argument('--time', type=float, default=PLAYER_DEFAULTS['time'], help='蒙特卡洛树搜索每步的时间（秒）')
+    parser.add_argument('--adaptive-time', action='store_true', help='按对局阶段分配每步时间，--time 为平均值')
+    parser.add_argument('--workers', type=int, default=PLAYER_DEFAULTS['workers'], help='根并行的进程数')
+    parser.add_argument('--rollout-batch', type=int, default=PLAYER_DEFAULTS['rollout_batch'], help='mcts 玩家每个叶节点的模拟次数')
+    parser.add_argument('--widening', type=float, nargs=2, metavar=('C', 'ALPHA'), default=PLAYER_DEFAULTS['widening'],
+                        help='mcts 玩家的渐进扩宽参数：访问 n 次的节点考虑 C * n ** ALPHA 个走法')
+    parser.add_argument('--endgame-empties', type=int, default=PLAYER_DEFAULTS['endgame_empties'],
+                        help='空格数不超过此值时搜索玩家改用残局精确求解，为 0 时不使用')
+    parser.add_argument('--book', default=PLAYER_DEFAULTS['book'], help='搜索玩家使用的开局库文件（见 opening_book.py）')
+    parser.add_argument('--no-book', dest='book', action='store_const', const=None, help='不使用开局库')
+    parser.add_argument('--model', default=PLAYER_DEFAULTS['model'], help='net 玩家的模型参数文件')
+    parser.add_argument('--mcts-n', type=int, default=PLAYER_DEFAULTS['mcts_n'], help='net 玩家每步的模拟次数')
+    parser.add_argument('--threads', type=int, default=PLAYER_DEFAULTS['threads'], help='net 玩家的搜索线程数')
+    parser.add_argument('--optimize', action='store_true', help='net 玩家使用 TorchScript 优化的推理')
+    parser.add_argument('--ponder', nargs='*', choices=['black', 'white'], default=None,
+                        help='在对方思考期间后台思考的一方（不带参数时双方都后台思考）')
+    args = parser.parse_args()
 
-#white_player = AIPlayerplus(policy_value_net.policy_value_fn,1000)
+    if args.list:
+        for name, (_, description) in PLAYERS.items():
+            print('{:14s} {}'.format(name, description))
+        return
 
-# 游戏初始化，第一个玩家是黑棋，第二个玩家是白棋
-game = Game(black_player, white_player)
-game.run()
+    # 黑棋、白棋玩家初始化
+    if args.ponder is None:
+        args.ponder = []
+    elif not args.ponder:
+        args.ponder = ['black', 'white']
+    players = []
+    for side, name, color in (('black', args.black, 'X'), ('white', args.white, 'O')):
+        if side in args.ponder:
+            players.append(create_pondering_player(name, color, args))
+        else:
+            players.append(create_player(name, color, args))
+    black_player, white_player = players
+
+    # 游戏初始化，第一个玩家是黑棋，第二个玩家是白棋
+    game = Game(black_player, white_player)
+    try:
+        game.run()
+    finally:
+        for player in players:
+            if hasattr(player, 'close'):
+                player.close()
+
+
+if __name__ == '__main__':
+    main()
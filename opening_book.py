@@ -0,0 +1,243 @@
+import os
+import mmap
+import struct
+import argparse
+from time import time
+from board import SQUARE_NAMES, Board, get_moves, popcount
+from symmetry import canonical, inverse_transform_bits, transform_bits
+
+'''
+开局库。
+库文件由定长记录组成、没有文件头，记录按开放寻址哈希表排列：槽数为 2 的幂（由文件大小确定），
+局面 (行棋方位棋盘, 对手位棋盘) 先用 symmetry.canonical 规范化，按其哈希值定位槽位，冲突时线性探测，
+全 0 的记录表示空槽（没有棋子的局面不会出现）。落子同样记录在规范化后的坐标系中。
+查找时以只读内存映射打开文件，只读取探测到的几条记录，与库的大小无关。
+
+离线生成（两种来源可以同时使用，自我对弈数据优先）：
+    python opening_book.py --depth 5 --player mcts --time 5 --out opening_book.bin
+    python opening_book.py --data selfplay_data --min-count 20 --max-ply 12 --out opening_book.bin
+'''
+
+DEFAULT_BOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+
+# 单条记录：行棋方位棋盘、对手位棋盘、落子位序号（规范化坐标系）、样本数
+RECORD = struct.Struct('<QQBxH')
+
+FULL = 0xFFFFFFFFFFFFFFFF
+
+
+def _hash(own, opp):
+    """
+    规范化局面的哈希值（64 位混合）
+    """
+    h = ((own ^ (opp * 0x9E3779B97F4A7C15)) * 0xBF58476D1CE4E5B9) & FULL
+    return h ^ (h >> 31)
+
+
+def write_book(path, entries):
+    """
+    把开局库写入文件
+    :param entries: {规范化局面 (own, opp): (落子位序号, 样本数)}
+    """
+    slots = 16
+    while slots < 2 * len(entries):
+        slots *= 2
+    mask = slots - 1
+    data = bytearray(slots * RECORD.size)
+    for (own, opp), (sq, count) in entries.items():
+        slot = _hash(own, opp) & mask
+        while RECORD.unpack_from(data, slot * RECORD.size)[:2] != (0, 0):
+            slot = (slot + 1) & mask
+        RECORD.pack_into(data, slot * RECORD.size, own, opp, sq, min(count, 0xFFFF))
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class OpeningBook(object):
+    '''
+    以内存映射方式只读打开的开局库
+    '''
+    def __init__(self, path=DEFAULT_BOOK):
+        """
+        :raise ValueError: 文件大小不是 2 的幂个记录（为空、被截断或不是开局库）
+        """
+        self.path = path
+        size = os.path.getsize(path)
+        slots = size // RECORD.size
+        if not slots or size != slots * RECORD.size or slots & (slots - 1):
+            raise ValueError('invalid opening book: {} ({} bytes)'.format(path, size))
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.slots = slots
+        self.mask = slots - 1
+
+    def probe(self, own, opp):
+        """
+        查找规范化局面
+        :return: (落子位序号, 样本数)，不在库中时返回 None
+        """
+        slot = _hash(own, opp) & self.mask
+        # 最多探测全部槽位一次：损坏或写满的库中可能没有空槽
+        for _ in range(self.slots):
+            book_own, book_opp, sq, count = RECORD.unpack_from(self._mmap, slot * RECORD.size)
+            if book_own == own and book_opp == opp:
+                return sq, count
+            if not book_own and not book_opp:
+                return None
+            slot = (slot + 1) & self.mask
+        return None
+
+    def lookup(self, board, color):
+        """
+        查找 color 一方在当前局面下的库内落子
+        :return: 落子坐标，例如 'D3'；不在库中时返回 None
+        """
+        own, opp = board._bits[color], board._bits['O' if color == 'X' else 'X']
+        (c_own, c_opp), k = canonical(own, opp)
+        entry = self.probe(c_own, c_opp)
+        if entry is None:
+            return None
+        move = inverse_transform_bits(1 << entry[0], k)
+        # 库文件损坏或哈希冲突时不返回非法落子
+        if not move & get_moves(own, opp):
+            return None
+        return SQUARE_NAMES[move.bit_length() - 1]
+
+    def __len__(self):
+        return sum(1 for slot in range(self.slots) if any(RECORD.unpack_from(self._mmap, slot * RECORD.size)[:2]))
+
+    def close(self):
+        self._mmap.close()
+
+
+# 路径 --> 已打开的开局库，同一进程中的多个玩家共用
+_books = {}
+
+
+def load_book(path=DEFAULT_BOOK):
+    """
+    打开开局库，文件不存在、为空或大小不合法时返回 None（不使用开局库）
+    """
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    if path not in _books:
+        book = None
+        if os.path.isfile(path) and os.path.getsize(path):
+            try:
+                book = OpeningBook(path)
+            except ValueError as exc:
+                print('忽略开局库：{}'.format(exc))
+        _books[path] = book
+    return _books[path]
+
+
+def opening_positions(depth):
+    """
+    广度优先枚举开局前 depth 步内的所有局面，对称局面只保留一个
+    :return: [(棋盘, 行棋方)]，按步数排序
+    """
+    positions = []
+    seen = set()
+    level = [(Board(), 'X')]
+    for _ in range(depth):
+        next_level = []
+        for board, color in level:
+            op_color = 'O' if color == 'X' else 'X'
+            actions = list(board.get_legal_actions(color))
+            if not actions:
+                if next(board.get_legal_actions(op_color), None) is not None:
+                    next_level.append((board, op_color))
+                continue
+            key = canonical(board._bits[color], board._bits[op_color])[0]
+            if key in seen:
+                continue
+            seen.add(key)
+            positions.append((board, color))
+            for action in actions:
+                child = board.clone()
+                child._move(action, color)
+                next_level.append((child, op_color))
+        level = next_level
+    return positions
+
+
+def book_from_search(depth, player_name, options):
+    """
+    对开局前 depth 步内的每个局面用指定玩家搜索出落子
+    :param player_name: 玩家名（见 players.py），options 为其选项（应关闭开局库）
+    :return: {规范化局面: (落子位序号, 样本数)}
+    """
+    from players import create_player
+    entries = {}
+    positions = [(board, color) for board, color in opening_positions(depth)
+                 if len(list(board.get_legal_actions(color))) > 1]
+    for i, (board, color) in enumerate(positions):
+        op_color = 'O' if color == 'X' else 'X'
+        player = create_player(player_name, color, options)
+        start = time()
+        action = player.get_move(board.clone())
+        (own, opp), k = canonical(board._bits[color], board._bits[op_color])
+        move = transform_bits(1 << SQUARE_NAMES.index(action), k)
+        entries[(own, opp)] = (move.bit_length() - 1, 1)
+        print('{}/{} 第 {} 步 {} {:.1f}s'.format(i + 1, len(positions), popcount(own | opp) - 4, action,
+                                                 time() - start))
+    return entries
+
+
+def book_from_games(data_dir, min_count, max_ply):
+    """
+    汇总自我对弈数据：同一规范化局面的 MCTS 落子概率相加，取概率和最大的落子
+    :param min_count: 局面至少出现的次数
+    :param max_ply: 只收录开局前 max_ply 步内的局面
+    :return: {规范化局面: (落子位序号, 样本数)}
+    """
+    import numpy as np
+    from selfplay import list_shards, open_shard
+    from symmetry import square_permutations
+    totals = {}
+    for path in list_shards(data_dir):
+        shard = open_shard(path)
+        planes = np.asarray(shard['state']).reshape(len(shard), 2, 64)
+        bits = np.packbits(planes, axis=2, bitorder='little').view('<u8')[:, :, 0]
+        keep = np.nonzero(planes.sum(axis=(1, 2)) <= 4 + max_ply)[0]
+        for i in keep.tolist():
+            (own, opp), k = canonical(int(bits[i, 0]), int(bits[i, 1]))
+            prob = np.asarray(shard['prob'][i], dtype=np.float64)[square_permutations()[k]]
+            entry = totals.get((own, opp))
+            if entry is None:
+                totals[(own, opp)] = [prob, 1]
+            else:
+                entry[0] += prob
+                entry[1] += 1
+    return {key: (int(prob.argmax()), count) for key, (prob, count) in totals.items() if count >= min_count}
+
+
+def main():
+    from players import PLAYERS, player_options
+    parser = argparse.ArgumentParser(description='生成开局库')
+    parser.add_argument('--out', default=DEFAULT_BOOK, help='开局库文件')
+    parser.add_argument('--depth', type=int, default=0, help='搜索开局前多少步内的全部局面，为 0 时不搜索')
+    parser.add_argument('--player', default='mcts', choices=list(PLAYERS), help='搜索局面使用的玩家')
+    parser.add_argument('--time', type=float, default=5, help='搜索每个局面的时间（秒）')
+    parser.add_argument('--mcts-n', type=int, default=2000, help='net 玩家每个局面的模拟次数')
+    parser.add_argument('--data', default=None, help='自我对弈分片目录')
+    parser.add_argument('--min-count', type=int, default=20, help='自我对弈数据中局面至少出现的次数')
+    parser.add_argument('--max-ply', type=int, default=12, help='只收录自我对弈数据中开局前多少步内的局面')
+    args = parser.parse_args()
+
+    entries = {}
+    if args.depth:
+        entries.update(book_from_search(args.depth, args.player,
+                                        player_options(time=args.time, mcts_n=args.mcts_n, endgame_empties=0,
+                                                       book=None)))
+    if args.data:
+        entries.update(book_from_games(args.data, args.min_count, args.max_ply))
+    write_book(args.out, entries)
+    print('开局库 {}：{} 个局面'.format(args.out, len(entries)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import random
+from time import time
+
+'''
+根并行蒙特卡洛树搜索：
+K 个进程各自以不同随机种子从同一局面独立建树，在同一截止时间前结束，
+再把根节点各子节点的访问次数与奖励累加合并，由调用方据此选择落子。
+'''
+
+
+def _run_worker(worker, board, color, deadline, seed, options):
+    """
+    进程池中执行的任务：设置随机种子后在剩余时间内搜索，返回根节点统计
+    """
+    random.seed(seed)
+    # 只在 NumPy 已导入时设置其全局种子，不使用 NumPy 的搜索函数（如 AIplayer2）无需导入
+    np = sys.modules.get('numpy')
+    if np is not None:
+        np.random.seed(seed % (2 ** 32))
+    return worker(board, color, max(deadline - time(), 0), seed=seed, **options)
+
+
+class RootParallelSearch(object):
+    '''
+    根并行搜索调度器，进程池在第一次搜索时创建并在之后的落子中复用
+    '''
+    def __init__(self, workers=None):
+        """
+        :param workers: 并行建树的进程数，默认为 CPU 核数
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+
+    def run(self, worker, board, color, time_limit, **options):
+        """
+        并行搜索并合并根节点统计
+        :param worker: 模块级搜索函数 worker(board, color, time_limit, seed=..., **options)，
+                       返回 {落子: (访问次数, 奖励)}
+        :param time_limit: 本步可用时间（秒），所有进程共用同一截止时间
+        :return: 合并后的 {落子: [访问次数, 奖励]}
+        """
+        if self.executor is None:
+            # 进程池模块导入较慢，只在真正并行时导入
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        deadline = time() + time_limit
+        futures = [self.executor.submit(_run_worker, worker, board, color, deadline,
+                                        random.getrandbits(63), options)
+                   for _ in range(self.workers)]
+        merged = {}
+        for future in futures:
+            for move, (visits, reward) in future.result().items():
+                stat = merged.setdefault(move, [0, 0])
+                stat[0] += visits
+                stat[1] += reward
+        return merged
+
+    def shutdown(self):
+        """
+        关闭进程池
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
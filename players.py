@@ -0,0 +1,142 @@
+import os
+import argparse
+from endgame import DEFAULT_EMPTIES
+from opening_book import DEFAULT_BOOK
+
+'''
+玩家注册表。
+每种玩家对应一个工厂函数，玩家模块在创建玩家时才导入；神经网络玩家的模型在第一次评估局面时才加载，
+因此只使用传统蒙特卡洛树搜索的对局不会导入 torch。
+创建玩家本身不导入 NumPy；mcts 玩家的搜索树保存在 NumPy 数组中，第一次搜索时导入，
+roxanne-mcts、alphabeta 玩家在搜索中不使用 NumPy。
+
+新增玩家时用 register_player 注册工厂函数，工厂函数接收执棋方与命令行选项：
+    @register_player('name', '说明')
+    def _make_xxx(color, options):
+        ...
+'''
+
+DEFAULT_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'best_policy.model')
+
+# 玩家名 --> (工厂函数, 说明)
+PLAYERS = {}
+
+# 工厂函数使用的选项及其默认值（与 main.py 的命令行参数对应）
+PLAYER_DEFAULTS = {'time': 3, 'workers': 1, 'rollout_batch': 1, 'model': DEFAULT_MODEL, 'mcts_n': 1000,
+                   'threads': 1, 'optimize': False, 'adaptive_time': False, 'widening': None,
+                   'endgame_empties': DEFAULT_EMPTIES, 'book': DEFAULT_BOOK}
+
+
+def register_player(name, description):
+    """
+    注册玩家工厂函数的装饰器
+    """
+    def decorator(factory):
+        PLAYERS[name] = (factory, description)
+        return factory
+    return decorator
+
+
+class LazyPolicyValueNet(object):
+    '''
+    延迟加载的 PolicyValueNet：第一次评估时才导入 torch 并以内存映射方式读入模型，
+    接口与 PolicyValueNet 的推理部分一致，同一模型文件的多个玩家共用一份网络
+    '''
+    _loaded = {}
+
+    def __init__(self, model_file=DEFAULT_MODEL, **options):
+        """
+        :param options: 传给 PolicyValueNet 的其他参数（如 use_gpu、optimize）
+        """
+        self.model_file = model_file
+        self.options = options
+        self.key = (os.path.abspath(model_file), tuple(sorted(options.items())))
+
+    @property
+    def net(self):
+        net = self._loaded.get(self.key)
+        if net is None:
+            from policy_value_net import PolicyValueNet
+            net = self._loaded[self.key] = PolicyValueNet(model_file=self.model_file, **self.options)
+        return net
+
+    @property
+    def weights_version(self):
+        return self.net.weights_version
+
+    def policy_value_fn(self, board):
+        return self.net.policy_value_fn(board)
+
+    def policy_value_fn_batch(self, boards):
+        return self.net.policy_value_fn_batch(boards)
+
+
+@register_player('mcts', '蒙特卡洛树搜索，随机模拟（AIplayer1）')
+def _make_mcts(color, options):
+    from AIplayer1 import AIPlayer
+    return AIPlayer(color, rollout_batch=options.rollout_batch, workers=options.workers,
+                    time_limit=options.time, adaptive_time=options.adaptive_time, widening=options.widening,
+                    endgame_empties=options.endgame_empties, book=options.book)
+
+
+@register_player('roxanne-mcts', '蒙特卡洛树搜索，Roxanne 策略模拟（AIplayer2）')
+def _make_roxanne_mcts(color, options):
+    from AIplayer2 import AIPlayer
+    return AIPlayer(color, time_limit=options.time, workers=options.workers, adaptive_time=options.adaptive_time,
+                    endgame_empties=options.endgame_empties, book=options.book)
+
+
+@register_player('roxanne', 'Roxanne 落子优先级表，不搜索')
+def _make_roxanne(color, options):
+    from AIplayer2 import RoxannePlayer
+    return RoxannePlayer(color)
+
+
+@register_player('alphabeta', '迭代加深 alpha-beta 搜索，模式表估值（AIplayer4）')
+def _make_alphabeta(color, options):
+    from AIplayer4 import AIPlayer
+    return AIPlayer(color, time_limit=options.time, adaptive_time=options.adaptive_time,
+                    endgame_empties=options.endgame_empties, book=options.book)
+
+
+@register_player('net', '策略价值网络引导的蒙特卡洛树搜索（AIplayer3）')
+def _make_net(color, options):
+    from AIplayer3 import AIPlayerplus
+    from eval_cache import EvalCache
+    net = LazyPolicyValueNet(options.model, optimize=options.optimize)
+    # 相邻两步的搜索中重复出现的局面与对称局面不再重复评估
+    cache = EvalCache(net)
+    player = AIPlayerplus(cache.policy_value_fn, options.mcts_n, options.threads, cache.policy_value_fn_batch,
+                          endgame_empties=options.endgame_empties, book=options.book)
+    player.eval_cache = cache
+    player.color = color
+    return player
+
+
+def player_options(**overrides):
+    """
+    以默认值为基础构造工厂函数的选项，便于在脚本中创建玩家
+    """
+    options = dict(PLAYER_DEFAULTS)
+    options.update(overrides)
+    return argparse.Namespace(**options)
+
+
+def create_player(name, color, options):
+    """
+    按名称创建玩家
+    :param options: 命令行选项（argparse.Namespace）
+    """
+    if name not in PLAYERS:
+        raise ValueError('unknown player: {} (available: {})'.format(name, ', '.join(PLAYERS)))
+    return PLAYERS[name][0](color, options)
+
+
+def create_pondering_player(name, color, options, quiet=False):
+    """
+    创建在独立进程中运行、对方思考期间后台思考的玩家（见 ponder.py）
+    """
+    if name not in PLAYERS:
+        raise ValueError('unknown player: {} (available: {})'.format(name, ', '.join(PLAYERS)))
+    from ponder import PonderingPlayer
+    return PonderingPlayer(create_player, name, color, options, quiet=quiet)
@@ -1,8 +1,10 @@
+import warnings
 import torch
 import torch.nn as nn
 import torch.optim as optim
 import torch.nn.functional as F
 import numpy as np
+from features import encode_batch
 
 def set_learning_rate(optimizer, lr):
     '''
@@ -10,6 +12,33 @@ def set_learning_rate(optimizer, lr):
     '''
     for param_group in optimizer.param_groups:
         param_group['lr'] = lr
+
+def load_params(model_file):
+    '''
+    以内存映射方式读取模型参数，只有实际用到的部分才从磁盘读入；旧格式的模型文件不支持映射，按普通方式读取
+    '''
+    try:
+        return torch.load(model_file, map_location='cpu', mmap=True)
+    except RuntimeError:
+        return torch.load(model_file, map_location='cpu')
+
+def optimize_for_inference(net, example, fuse=True):
+    '''
+    把网络转为只用于推理的 TorchScript 模块：
+    trace 得到静态图，freeze 把参数折叠为常量；fuse 为真时再由 optimize_for_inference
+    转为 MKLDNN 卷积并融合 conv+ReLU 等算子（批较大时更快，批大小为 1 时格式转换的开销反而更大）
+    '''
+    training = net.training
+    net.eval()
+    try:
+        with warnings.catch_warnings():
+            # 新版本 PyTorch 对 TorchScript 给出弃用提示，不影响使用
+            warnings.simplefilter('ignore', FutureWarning)
+            with torch.no_grad():
+                frozen = torch.jit.freeze(torch.jit.trace(net, example))
+                return torch.jit.optimize_for_inference(frozen) if fuse else frozen
+    finally:
+        net.train(training)
         
 class Net(nn.Module):
     '''
@@ -49,8 +78,19 @@ class PolicyValueNet():
     '''
     策略价值网络
     '''
-    def __init__(self, model_file=None, use_gpu=False):
+    # 加载后预热的批大小
+    WARMUP_BATCHES = (1, 8, 32)
+    # 批大小不小于该值时使用融合算子的推理模块
+    FUSE_MIN_BATCH = 16
+
+    def __init__(self, model_file=None, use_gpu=False, optimize=False):
+        '''
+        :param optimize: 是否使用 TorchScript 优化后的推理模块，并在加载时预热
+        '''
         self.use_gpu = use_gpu
+        self.optimize = optimize
+        self._inference_nets = {}
+        self._inference_version = None
         self.l2_const = 1e-4   # l2正则化系数
         # 策略网络模型
         if self.use_gpu:
@@ -58,10 +98,47 @@ class PolicyValueNet():
         else:
             self.policy_value_net = Net()
         self.optimizer = optim.Adam(self.policy_value_net.parameters(), weight_decay=self.l2_const)
+        # 权重版本号，每次加载或训练后加一，评估缓存据此失效
+        self.weights_version = 0
         if model_file:
-            net_params = torch.load(model_file)
+            net_params = load_params(model_file)
             self.policy_value_net.load_state_dict(net_params)
-            
+            self.weights_version += 1
+        if optimize:
+            self.warmup()
+
+    def inference_net(self, batch_size=1):
+        '''
+        返回用于推理的模块：未开启优化时就是原网络；
+        开启优化时按批大小返回冻结的 TorchScript 模块，权重更新后重新生成
+        '''
+        if not self.optimize:
+            return self.policy_value_net
+        if self._inference_version != self.weights_version:
+            self._inference_nets.clear()
+            self._inference_version = self.weights_version
+        fuse = batch_size >= self.FUSE_MIN_BATCH and not self.use_gpu
+        if fuse not in self._inference_nets:
+            example = torch.zeros((1, 2, 8, 8))
+            if self.use_gpu:
+                example = example.cuda()
+            self._inference_nets[fuse] = optimize_for_inference(self.policy_value_net, example, fuse)
+        return self._inference_nets[fuse]
+
+    def warmup(self, batch_sizes=None):
+        '''
+        用空棋盘跑几批前向传播，把图优化、内存分配与算子初始化的开销放在加载时而不是第一步棋
+        '''
+        with torch.inference_mode():
+            for batch_size in batch_sizes or self.WARMUP_BATCHES:
+                net = self.inference_net(batch_size)
+                state_batch = torch.zeros((batch_size, 2, 8, 8))
+                if self.use_gpu:
+                    state_batch = state_batch.cuda()
+                # TorchScript 的性能分析执行器前几次调用才完成优化
+                for _ in range(3):
+                    net(state_batch)
+
     def policy_value(self, state_batch):
         '''
         训练用
@@ -85,29 +162,49 @@ class PolicyValueNet():
         '''
         current_state = np.expand_dims(board.current_state(), axis=0)
         current_state = np.ascontiguousarray(current_state)
-        if self.use_gpu:
-            log_act_probs, value = self.policy_value_net(torch.from_numpy(current_state).cuda().float())
-            act_probs = np.exp(log_act_probs.detach().cpu().numpy())
-            act_probs = np.reshape(act_probs,(8, 8))
-        else:
-            log_act_probs, value = self.policy_value_net(torch.from_numpy(current_state).float())
-            act_probs = np.exp(log_act_probs.detach().numpy())  
-            act_probs = np.reshape(act_probs,(8, 8))
-        value = value[0][0]
+        net = self.inference_net()
+        with torch.inference_mode():
+            if self.use_gpu:
+                log_act_probs, value = net(torch.from_numpy(current_state).cuda().float())
+                act_probs = np.exp(log_act_probs.cpu().numpy())
+                act_probs = np.reshape(act_probs,(8, 8))
+            else:
+                log_act_probs, value = net(torch.from_numpy(current_state).float())
+                act_probs = np.exp(log_act_probs.numpy())
+                act_probs = np.reshape(act_probs,(8, 8))
+            value = value[0][0].item()
         return act_probs, value
     
+    def policy_value_fn_batch(self, boards):
+        '''
+        input:棋盘列表
+        output：[(落子概率, 局面评估)]
+        多个棋盘合并为一批，只做一次前向传播
+        '''
+        state_batch = encode_batch(boards)
+        net = self.inference_net(len(boards))
+        with torch.inference_mode():
+            state_batch = torch.from_numpy(state_batch).float()
+            if self.use_gpu:
+                state_batch = state_batch.cuda()
+            log_act_probs, value = net(state_batch)
+            act_probs = np.exp(log_act_probs.cpu().numpy()).reshape(-1, 8, 8)
+            value = value.cpu().numpy()
+        return [(act_probs[i], value[i][0]) for i in range(len(boards))]
+
     def train_step(self, state_batch, mcts_probs, winner_batch, lr):
         '''
         进行一次训练
+        输入可以是列表/数组，也可以是已经分配好的 float 张量（此时不再重新构造张量）
         '''
+        if not torch.is_tensor(state_batch):
+            state_batch = torch.FloatTensor(np.asarray(state_batch))
+            mcts_probs = torch.FloatTensor(np.asarray(mcts_probs))
+            winner_batch = torch.FloatTensor(np.asarray(winner_batch))
         if self.use_gpu:
-            state_batch = torch.FloatTensor(state_batch).cuda()
-            mcts_probs = torch.FloatTensor(mcts_probs).cuda()
-            winner_batch = torch.FloatTensor(winner_batch).cuda()
-        else:
-            state_batch = torch.FloatTensor(state_batch)
-            mcts_probs = torch.FloatTensor(mcts_probs)
-            winner_batch = torch.FloatTensor(winner_batch)
+            state_batch = state_batch.cuda(non_blocking=True)
+            mcts_probs = mcts_probs.cuda(non_blocking=True)
+            winner_batch = winner_batch.cuda(non_blocking=True)
         
         mcts_probs = mcts_probs.view(-1, 64)
         # 使参数梯度归0
@@ -125,6 +222,7 @@ class PolicyValueNet():
         # 反向传播并优化
         loss.backward()
         self.optimizer.step()
+        self.weights_version += 1
         # 通过落子熵观察情况
         entropy = -torch.mean(torch.sum(torch.exp(log_act_probs) * log_act_probs,1))
        
@@ -0,0 +1,84 @@
+import os
+import sys
+import multiprocessing as mp
+
+'''
+后台思考（pondering）。
+玩家在独立进程中运行：收到落子请求后照常搜索并返回落子，随后调用玩家的 ponder 方法，
+在对方思考期间继续扩展同一棵搜索树，直到下一个请求到达；玩家据此复用与对方实际应手对应的子树，
+再在自己的时间内继续搜索。使用进程而不是线程，是为了不与对方在同一进程中争用 GIL。
+对方与己方需运行在不同的 CPU 核上，后台思考才不会拖慢对方。
+
+使用方法：
+    from players import create_player
+    player = PonderingPlayer(create_player, 'mcts', 'X', options)
+    ...
+    player.close()
+'''
+
+
+def _ponder_worker(conn, factory, args, quiet):
+    """
+    思考进程：循环处理落子请求 (棋盘, 执棋方)，返回落子后一直思考到下一个请求到达；收到 None 时退出
+    """
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    player = factory(*args)
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        board, color = request
+        player.color = color
+        move = player.get_move(board)
+        conn.send(move)
+        if move is not None and hasattr(player, 'ponder'):
+            board._move(move, color)
+            player.ponder(board, conn.poll)
+    conn.close()
+
+
+class PonderingPlayer(object):
+    '''
+    在独立进程中运行玩家并在对方思考期间后台思考，接口与普通玩家一致（color 属性与 get_move 方法）
+    '''
+    def __init__(self, factory, *args, quiet=False):
+        """
+        :param factory: 可被 pickle 的模块级函数，factory(*args) 在思考进程中创建玩家
+        :param quiet: 是否屏蔽思考进程中玩家的打印信息
+        """
+        ctx = mp.get_context('spawn')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_ponder_worker, args=(child_conn, factory, args, quiet), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.color = None
+
+    def get_move(self, board):
+        """
+        把当前局面发给思考进程，等待其落子
+        """
+        self.conn.send((board.clone(), self.color))
+        return self.conn.recv()
+
+    def close(self):
+        """
+        结束思考进程
+        """
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
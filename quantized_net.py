@@ -0,0 +1,140 @@
+import random
+import warnings
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.ao.quantization as tq
+from board import Board
+from features import encode_board
+from policy_value_net import Net, PolicyValueNet
+
+'''
+策略价值网络的 int8 量化版本（训练后静态量化）。
+卷积与全连接层的权重和激活都量化为 int8，conv+ReLU、linear+ReLU 融合为单个量化算子；
+log_softmax 与 tanh 在反量化后的浮点上计算。激活的量化范围由一批记录下来的局面校准得到。
+参数直接从 best_policy.model 这类浮点模型文件加载，不需要单独保存量化模型。
+
+注：动态量化只覆盖 Linear 层，而本网络的计算量几乎全在卷积层，所以这里采用静态量化。
+'''
+
+
+class QuantNet(Net):
+    '''
+    可量化的 Net：参数名与 Net 相同，ReLU 改为模块以便融合，输入输出处加量化/反量化
+    '''
+    def __init__(self):
+        super().__init__()
+        self.quant = tq.QuantStub()
+        self.dequant_act = tq.DeQuantStub()
+        self.dequant_val = tq.DeQuantStub()
+        self.relu1 = nn.ReLU()
+        self.relu2 = nn.ReLU()
+        self.relu3 = nn.ReLU()
+        self.act_relu = nn.ReLU()
+        self.val_relu1 = nn.ReLU()
+        self.val_relu2 = nn.ReLU()
+
+    # 需要融合的 (层, ReLU) 对
+    FUSE_PAIRS = [['conv1', 'relu1'], ['conv2', 'relu2'], ['conv3', 'relu3'], ['act_conv1', 'act_relu'],
+                  ['val_conv1', 'val_relu1'], ['val_fc1', 'val_relu2']]
+
+    def forward(self, state_input):
+        # 公共层
+        x = self.quant(state_input)
+        x = self.relu1(self.conv1(x))
+        x = self.relu2(self.conv2(x))
+        x = self.relu3(self.conv3(x))
+        # 行动策略层
+        x_act = self.act_relu(self.act_conv1(x))
+        x_act = x_act.reshape(-1, 2*8*8)
+        x_act = F.log_softmax(self.dequant_act(self.act_fc1(x_act)), dim=1)
+        # 价值层
+        x_val = self.val_relu1(self.val_conv1(x))
+        x_val = x_val.reshape(-1, 2*8*8)
+        x_val = self.val_relu2(self.val_fc1(x_val))
+        x_val = torch.tanh(self.dequant_val(self.val_fc2(x_val)))
+        return x_act, x_val
+
+
+def default_engine():
+    """
+    x86 上使用 x86（fbgemm）后端，ARM 上使用 qnnpack
+    """
+    engines = torch.backends.quantized.supported_engines
+    return 'x86' if 'x86' in engines else 'qnnpack'
+
+
+def sample_positions(n, seed=None):
+    """
+    随机对弈采样局面，用于没有自我对弈数据时的校准与评估
+    :return: (n, 2, 8, 8) float32 特征平面（行棋方视角）
+    """
+    rng = random.Random(seed)
+    states = []
+    while len(states) < n:
+        board = Board()
+        color = 'X'
+        while not board.is_game_over() and len(states) < n:
+            actions = list(board.get_legal_actions(color))
+            if actions:
+                states.append(encode_board(board, color))
+                board._move(rng.choice(actions), color)
+            color = 'O' if color == 'X' else 'X'
+    return np.array(states, dtype=np.float32)
+
+
+def quantize_net(net, calibration_states, engine=None, batch_size=256):
+    """
+    对浮点 Net 做训练后静态量化
+    :param net: 已加载参数的 Net
+    :param calibration_states: (N, 2, 8, 8) 校准局面
+    :return: 量化后的 QuantNet（eval 模式，只能在 CPU 上推理）
+    """
+    engine = engine or default_engine()
+    torch.backends.quantized.engine = engine
+    qnet = QuantNet()
+    qnet.load_state_dict({k: v.cpu() for k, v in net.state_dict().items()})
+    qnet.eval()
+    qnet.qconfig = tq.get_default_qconfig(engine)
+    with warnings.catch_warnings():
+        # torch.ao.quantization 在新版本中给出迁移提示，不影响使用
+        warnings.simplefilter('ignore', DeprecationWarning)
+        warnings.simplefilter('ignore', UserWarning)
+        tq.fuse_modules(qnet, QuantNet.FUSE_PAIRS, inplace=True)
+        tq.prepare(qnet, inplace=True)
+        with torch.inference_mode():
+            for i in range(0, len(calibration_states), batch_size):
+                qnet(torch.from_numpy(np.ascontiguousarray(calibration_states[i:i + batch_size], dtype=np.float32)))
+        tq.convert(qnet, inplace=True)
+    return qnet
+
+
+class QuantizedPolicyValueNet(PolicyValueNet):
+    '''
+    使用 int8 量化网络推理的 PolicyValueNet，policy_value_fn / policy_value_fn_batch 接口不变
+    训练（train_step）仍作用于浮点网络，训练后需重新调用 quantize
+    '''
+    def __init__(self, model_file=None, calibration_states=None, engine=None, calibration_size=2000, min_batch=1):
+        """
+        :param calibration_states: 校准局面 (N, 2, 8, 8)，为空时用随机对弈采样 calibration_size 个局面
+        :param min_batch: 批大小小于该值时改用（TorchScript 优化的）浮点网络，
+                          量化/反量化的固定开销使 int8 在极小的批上反而更慢
+        """
+        super().__init__(model_file=model_file)
+        self.engine = engine
+        self.min_batch = min_batch
+        if calibration_states is None:
+            calibration_states = sample_positions(calibration_size, seed=0)
+        self.quantize(calibration_states)
+        self.optimize = min_batch > 1
+        self.warmup()
+
+    def quantize(self, calibration_states):
+        self.quantized_net = quantize_net(self.policy_value_net, calibration_states, self.engine)
+        self.weights_version += 1
+
+    def inference_net(self, batch_size=1):
+        if batch_size < self.min_batch:
+            return super().inference_net(batch_size)
+        return self.quantized_net
@@ -0,0 +1,187 @@
+import os
+import glob
+import argparse
+import random
+from time import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from board import Board
+from features import encode_board
+
+'''
+自我对弈数据生成。
+多个进程各自加载一份模型，用 AIPlayerplus.move1 进行自我对弈，记录
+(特征平面, MCTS 落子概率, 最终胜负) 三元组，并以定长记录追加写入各进程自己的分片文件。
+分片文件是没有文件头的定长记录，可以直接用 np.memmap 映射读取，写到一半的记录会被忽略。
+
+使用方法：
+    python selfplay.py --model best_policy.model --games 100 --workers 8 --mcts-n 200 --out selfplay_data
+'''
+
+# 单条样本：特征平面（0/1）、64 格落子概率、行棋方视角的最终结果（胜 1，负 -1，平 0）
+SAMPLE_DTYPE = np.dtype([('state', np.uint8, (2, 8, 8)), ('prob', np.float32, (64,)), ('winner', np.float32)])
+
+
+class ShardWriter(object):
+    '''
+    只追加的分片写入器，单个分片超过 max_samples 条后换新文件
+    '''
+    def __init__(self, directory, prefix, max_samples=100000):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_samples = max_samples
+        self.index = 0
+        self.count = 0
+        os.makedirs(directory, exist_ok=True)
+        self.path = self._next_path()
+
+    def _next_path(self):
+        """
+        跳过已存在的分片，返回下一个可用的分片路径
+        """
+        while True:
+            path = os.path.join(self.directory, '{}_{:05d}.bin'.format(self.prefix, self.index))
+            if not os.path.exists(path):
+                return path
+            self.index += 1
+
+    def append(self, states, probs, winners):
+        """
+        追加一批样本
+        :param states: (N, 2, 8, 8)
+        :param probs: (N, 64) 或 (N, 8, 8)
+        :param winners: (N,)
+        """
+        records = np.empty(len(states), dtype=SAMPLE_DTYPE)
+        records['state'] = states
+        records['prob'] = np.asarray(probs).reshape(len(states), 64)
+        records['winner'] = winners
+        if self.count and self.count + len(records) > self.max_samples:
+            self.index += 1
+            self.path = self._next_path()
+            self.count = 0
+        with open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+        self.count += len(records)
+
+
+def list_shards(directory):
+    """
+    按文件名排序列出目录下的所有分片
+    """
+    return sorted(glob.glob(os.path.join(directory, '*.bin')))
+
+
+def open_shard(path, start=0):
+    """
+    以只读内存映射方式打开分片
+    :param start: 跳过前 start 条样本
+    :return: 结构化数组（字段 state / prob / winner），只包含已完整写入的记录
+    """
+    n = os.path.getsize(path) // SAMPLE_DTYPE.itemsize
+    if n <= start:
+        return np.empty(0, dtype=SAMPLE_DTYPE)
+    return np.memmap(path, dtype=SAMPLE_DTYPE, mode='r', offset=start * SAMPLE_DTYPE.itemsize,
+                     shape=(n - start,))
+
+
+def play_selfplay_game(player):
+    """
+    用同一个 AIPlayerplus 执双方下完一局
+    :return: states (N, 2, 8, 8) uint8, probs (N, 64) float32, winners (N,) float32
+    """
+    board = Board()
+    color = 'X'
+    states, probs, colors = [], [], []
+    while not board.is_game_over():
+        if next(board.get_legal_actions(color), None) is None:
+            color = 'O' if color == 'X' else 'X'
+            continue
+        player.color = color
+        action, mcts_prob = player.move1(board)
+        states.append(encode_board(board, color).astype(np.uint8))
+        probs.append(np.asarray(mcts_prob, dtype=np.float32).reshape(64))
+        colors.append(color)
+        board._move(action, color)
+        color = 'O' if color == 'X' else 'X'
+    winner, _ = board.get_winner()
+    win_color = {0: 'X', 1: 'O', 2: None}[winner]
+    winners = np.array([0 if win_color is None else (1 if c == win_color else -1) for c in colors],
+                       dtype=np.float32)
+    return np.array(states), np.array(probs), winners
+
+
+# 工作进程中的全局状态，由 _init_worker 初始化
+_worker = {}
+
+
+def _init_worker(model_file, mcts_n, n_threads, directory, cache_size):
+    """
+    进程池初始化：每个进程只加载一次模型，并使用自己的分片文件
+    """
+    import torch
+    from policy_value_net import PolicyValueNet
+    from AIplayer3 import AIPlayerplus
+    from eval_cache import EvalCache
+    # 多进程并行时每个进程只用一个计算线程，避免线程数超过核数
+    torch.set_num_threads(1)
+    net = PolicyValueNet(model_file=model_file)
+    evaluator = EvalCache(net, cache_size) if cache_size else net
+    _worker['player'] = AIPlayerplus(evaluator.policy_value_fn, mcts_n, n_threads,
+                                     evaluator.policy_value_fn_batch)
+    _worker['writer'] = ShardWriter(directory, 'selfplay_{}'.format(os.getpid()))
+
+
+def _play_games(n_games, seed):
+    """
+    工作进程执行的任务：下 n_games 局并写入分片
+    :return: (对局数, 样本数)
+    """
+    random.seed(seed)
+    np.random.seed(seed % (2 ** 32))
+    samples = 0
+    for _ in range(n_games):
+        states, probs, winners = play_selfplay_game(_worker['player'])
+        _worker['writer'].append(states, probs, winners)
+        samples += len(states)
+    return n_games, samples
+
+
+def run_selfplay(model_file, games, workers, directory, mcts_n=400, n_threads=1, cache_size=100000,
+                 games_per_task=1):
+    """
+    并行生成自我对弈数据
+    :return: (对局数, 样本数, 用时秒数)
+    """
+    start = time()
+    tasks = [games_per_task] * (games // games_per_task)
+    if games % games_per_task:
+        tasks.append(games % games_per_task)
+    total_games = total_samples = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_file, mcts_n, n_threads, directory, cache_size)) as executor:
+        for n, samples in executor.map(_play_games, tasks, [random.getrandbits(63) for _ in tasks]):
+            total_games += n
+            total_samples += samples
+    return total_games, total_samples, time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并行自我对弈数据生成')
+    parser.add_argument('--model', default='best_policy.model')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--mcts-n', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=1, help='每局搜索的线程数（见 Mcts_plus）')
+    parser.add_argument('--cache', type=int, default=100000, help='评估缓存容量，0 表示不用缓存')
+    parser.add_argument('--out', default='selfplay_data')
+    args = parser.parse_args()
+
+    games, samples, elapsed = run_selfplay(args.model, args.games, args.workers, args.out,
+                                           args.mcts_n, args.threads, args.cache)
+    print('对局数: {}  样本数: {}  用时: {:.1f}s'.format(games, samples, elapsed))
+    print('每小时对局数: {:.1f}  每秒样本数: {:.1f}'.format(games / elapsed * 3600, samples / elapsed))
+
+
+if __name__ == '__main__':
+    main()
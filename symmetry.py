@@ -0,0 +1,142 @@
+'''
+棋盘的 8 种二面体对称变换（旋转与镜像）。
+变换编号 k 的三个二进制位依次表示：上下翻转、左右翻转、沿主对角线转置，按此顺序执行。
+位棋盘与 8x8 数组（落子概率、特征平面的最后两维）使用相同的编号，保证两者同步变换。
+位棋盘变换不依赖 NumPy，只有数组变换在调用时才导入，开局库等只用位棋盘的模块不会因此导入 NumPy。
+'''
+
+FULL = 0xFFFFFFFFFFFFFFFF
+
+
+def flip_vertical(x):
+    """
+    上下翻转（第 i 行 --> 第 7-i 行），即字节逆序
+    """
+    return int.from_bytes(x.to_bytes(8, 'little'), 'big')
+
+
+def mirror_horizontal(x):
+    """
+    左右翻转（第 j 列 --> 第 7-j 列），即每个字节内的位逆序
+    """
+    x = ((x >> 1) & 0x5555555555555555) | ((x & 0x5555555555555555) << 1)
+    x = ((x >> 2) & 0x3333333333333333) | ((x & 0x3333333333333333) << 2)
+    x = ((x >> 4) & 0x0F0F0F0F0F0F0F0F) | ((x & 0x0F0F0F0F0F0F0F0F) << 4)
+    return x
+
+
+def transpose(x):
+    """
+    沿主对角线 A1-H8 转置（第 i 行第 j 列 --> 第 j 行第 i 列）
+    """
+    t = 0x0F0F0F0F00000000 & (x ^ (x << 28))
+    x ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (x ^ (x << 14))
+    x ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (x ^ (x << 7))
+    x ^= t ^ (t >> 7)
+    return x & FULL
+
+
+def transform_bits(x, k):
+    """
+    对位棋盘施加第 k 种对称变换
+    """
+    if k & 1:
+        x = flip_vertical(x)
+    if k & 2:
+        x = mirror_horizontal(x)
+    if k & 4:
+        x = transpose(x)
+    return x
+
+
+def inverse_transform_bits(x, k):
+    """
+    第 k 种对称变换的逆变换
+    """
+    if k & 4:
+        x = transpose(x)
+    if k & 2:
+        x = mirror_horizontal(x)
+    if k & 1:
+        x = flip_vertical(x)
+    return x
+
+
+def canonical(own, opp):
+    """
+    取 8 种对称局面中 (own, opp) 最小者作为代表
+    :return: (代表局面 (own, opp), 变换编号 k)，代表局面 = 原局面经第 k 种变换
+    """
+    best, best_k = (own, opp), 0
+    for k in range(1, 8):
+        candidate = (transform_bits(own, k), transform_bits(opp, k))
+        if candidate < best:
+            best, best_k = candidate, k
+    return best, best_k
+
+
+def transform_array(a, k):
+    """
+    对数组最后两维（8x8）施加第 k 种对称变换
+    """
+    if k & 1:
+        a = a[..., ::-1, :]
+    if k & 2:
+        a = a[..., :, ::-1]
+    if k & 4:
+        a = a.swapaxes(-1, -2)
+    return a
+
+
+def inverse_transform_array(a, k):
+    """
+    transform_array 的逆变换
+    """
+    if k & 4:
+        a = a.swapaxes(-1, -2)
+    if k & 2:
+        a = a[..., :, ::-1]
+    if k & 1:
+        a = a[..., ::-1, :]
+    return a
+
+
+_square_permutations = None
+
+
+def square_permutations():
+    """
+    格子置换表，第一次调用时构造
+    :return: (8, 64) 数组，[k][i] 为第 k 种变换后第 i 格的取值来自变换前的哪一格
+    """
+    global _square_permutations
+    if _square_permutations is None:
+        import numpy as np
+        _square_permutations = np.stack([
+            np.ascontiguousarray(transform_array(np.arange(64).reshape(8, 8), k)).reshape(64) for k in range(8)])
+    return _square_permutations
+
+
+def augment_batch(states, probs, rng, out_states=None, out_probs=None):
+    """
+    为批中每个样本随机选取一种对称变换，同时作用于特征平面与落子概率
+    :param states: (B, C, 8, 8) 特征平面
+    :param probs: (B, 64) 或 (B, 8, 8) 落子概率
+    :param rng: numpy 随机数生成器
+    :return: 变换后的 (states, probs)，形状与输入一致；给出 out_* 时直接写入
+    """
+    import numpy as np
+    batch = len(states)
+    perm = square_permutations()[rng.integers(0, 8, batch)]
+    flat_states = np.asarray(states).reshape(batch, -1, 64)
+    new_states = np.take_along_axis(flat_states, perm[:, None, :], axis=-1).reshape(np.shape(states))
+    new_probs = np.take_along_axis(np.asarray(probs).reshape(batch, 64), perm, axis=-1).reshape(np.shape(probs))
+    if out_states is not None:
+        out_states[...] = new_states
+        new_states = out_states
+    if out_probs is not None:
+        out_probs[...] = new_probs
+        new_probs = out_probs
+    return new_states, new_probs
@@ -0,0 +1,192 @@
+import argparse
+import queue
+import threading
+from time import time
+import numpy as np
+import torch
+from policy_value_net import PolicyValueNet
+from selfplay import list_shards, open_shard
+from symmetry import augment_batch
+
+'''
+策略价值网络的流式训练。
+样本存放在定长的环形回放缓冲区（NumPy 数组）中，新的自我对弈分片增量读入，不重新加载旧数据；
+小批量直接采样写入预先分配、循环复用的张量，由后台线程提前准备下一批。
+
+使用方法：
+    python train.py --data selfplay_data --model best_policy.model --out current_policy.model --steps 1000
+'''
+
+
+class ReplayBuffer(object):
+    '''
+    环形回放缓冲区，写满后覆盖最旧的样本
+    '''
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, 2, 8, 8), dtype=np.uint8)
+        self.probs = np.zeros((capacity, 64), dtype=np.float32)
+        self.winners = np.zeros(capacity, dtype=np.float32)
+        self.size = 0
+        self.cursor = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def add(self, states, probs, winners):
+        """
+        追加一批样本
+        """
+        n = len(states)
+        if n > self.capacity:
+            states, probs, winners = states[-self.capacity:], probs[-self.capacity:], winners[-self.capacity:]
+            n = self.capacity
+        with self.lock:
+            idx = (self.cursor + np.arange(n)) % self.capacity
+            self.states[idx] = states
+            self.probs[idx] = np.asarray(probs).reshape(n, 64)
+            self.winners[idx] = winners
+            self.cursor = (self.cursor + n) % self.capacity
+            self.size = min(self.size + n, self.capacity)
+
+    def sample_into(self, states, probs, winners, rng, augment=False):
+        """
+        均匀采样一个小批量，直接写入给定的数组（可以是张量共享内存的 numpy 视图）
+        :param states: (B, 2, 8, 8) float32 数组
+        :param probs: (B, 64) float32 数组
+        :param winners: (B,) float32 数组
+        :param augment: 是否对每个样本随机施加一种对称变换（特征平面与落子概率同步变换）
+        """
+        with self.lock:
+            idx = rng.integers(0, self.size, len(winners))
+            np.take(self.winners, idx, out=winners)
+            if augment:
+                augment_batch(self.states[idx], self.probs[idx], rng, states, probs)
+            else:
+                states[...] = self.states[idx]
+                np.take(self.probs, idx, axis=0, out=probs)
+
+
+class ShardStreamer(object):
+    '''
+    增量读取自我对弈分片：记录每个分片已读取的条数，只读入新追加的样本
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        self.offsets = {}
+
+    def poll(self, buffer):
+        """
+        把目录中新增的样本读入回放缓冲区
+        :return: 本次读入的样本数
+        """
+        added = 0
+        for path in list_shards(self.directory):
+            start = self.offsets.get(path, 0)
+            records = open_shard(path, start)
+            if len(records):
+                buffer.add(records['state'], records['prob'], records['winner'])
+                self.offsets[path] = start + len(records)
+                added += len(records)
+        return added
+
+
+class BatchPrefetcher(object):
+    '''
+    后台线程预取小批量。预先分配 slots 组张量循环使用：
+    后台线程把采样结果写入空闲的一组，训练线程用完后归还。
+    '''
+    def __init__(self, buffer, batch_size, slots=3, seed=None, pin_memory=False, augment=True):
+        self.buffer = buffer
+        self.augment = augment
+        self.rng = np.random.default_rng(seed)
+        self.free = queue.Queue()
+        self.ready = queue.Queue()
+        for _ in range(slots):
+            tensors = (torch.empty((batch_size, 2, 8, 8)), torch.empty((batch_size, 64)), torch.empty(batch_size))
+            if pin_memory:
+                tensors = tuple(t.pin_memory() for t in tensors)
+            self.free.put(tensors)
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped:
+            tensors = self.free.get()
+            if tensors is None:
+                return
+            self.buffer.sample_into(*(t.numpy() for t in tensors), rng=self.rng, augment=self.augment)
+            self.ready.put(tensors)
+
+    def get(self):
+        """
+        取出一批 (state_batch, mcts_probs, winner_batch) 张量，用完后需调用 release 归还
+        """
+        return self.ready.get()
+
+    def release(self, tensors):
+        self.free.put(tensors)
+
+    def stop(self):
+        self.stopped = True
+        self.free.put(None)
+        self.thread.join()
+
+
+def train(policy_value_net, data_dir, steps, batch_size=512, lr=2e-3, buffer_size=500000,
+          poll_every=100, log_every=100, min_samples=None, augment=True):
+    """
+    训练主循环：定期读入新分片，从回放缓冲区采样训练，并报告速度
+    :param poll_every: 每隔多少步检查一次新的分片
+    :param augment: 采样时是否随机对称变换
+    """
+    buffer = ReplayBuffer(buffer_size)
+    streamer = ShardStreamer(data_dir)
+    streamer.poll(buffer)
+    if len(buffer) < (min_samples or batch_size):
+        raise ValueError('not enough samples in {}: {}'.format(data_dir, len(buffer)))
+    prefetcher = BatchPrefetcher(buffer, batch_size, pin_memory=policy_value_net.use_gpu, augment=augment)
+    start = last = time()
+    try:
+        for step in range(1, steps + 1):
+            tensors = prefetcher.get()
+            loss, entropy = policy_value_net.train_step(*tensors, lr)
+            prefetcher.release(tensors)
+            if step % poll_every == 0:
+                streamer.poll(buffer)
+            if step % log_every == 0:
+                now = time()
+                rate = log_every / (now - last)
+                print('step {}  loss {:.4f}  entropy {:.4f}  buffer {}  {:.1f} steps/s  {:.0f} samples/s'.format(
+                    step, loss, entropy, len(buffer), rate, rate * batch_size))
+                last = now
+    finally:
+        prefetcher.stop()
+    elapsed = time() - start
+    return steps / elapsed, steps * batch_size / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='策略价值网络流式训练')
+    parser.add_argument('--data', default='selfplay_data')
+    parser.add_argument('--model', default=None, help='初始模型参数')
+    parser.add_argument('--out', default='current_policy.model')
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=512)
+    parser.add_argument('--lr', type=float, default=2e-3)
+    parser.add_argument('--buffer-size', type=int, default=500000)
+    parser.add_argument('--use-gpu', action='store_true')
+    parser.add_argument('--no-augment', action='store_true', help='关闭对称变换数据增强')
+    args = parser.parse_args()
+
+    net = PolicyValueNet(model_file=args.model, use_gpu=args.use_gpu)
+    steps_per_sec, samples_per_sec = train(net, args.data, args.steps, args.batch_size, args.lr, args.buffer_size,
+                                           augment=not args.no_augment)
+    print('平均 {:.1f} steps/s, {:.0f} samples/s'.format(steps_per_sec, samples_per_sec))
+    net.save_model(args.out)
+
+
+if __name__ == '__main__':
+    main()